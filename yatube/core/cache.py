@@ -0,0 +1,63 @@
+import math
+import random
+import time
+
+from django.core.cache import caches
+
+LOCK_SUFFIX = ':lock'
+# Сколько секунд держится блокировка пересчёта
+LOCK_TIMEOUT = 30
+# Сколько секунд ждать чужого пересчёта при пустом кэше
+LOCK_WAIT = 5
+POLL_INTERVAL = 0.05
+# Чем больше beta, тем раньше начинается досрочный пересчёт
+BETA = 1.0
+
+
+def _store(cache, key, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    expires = None if timeout is None else time.time() + timeout
+    cache.set(key, (value, delta, expires), timeout)
+    return value
+
+
+def _is_fresh(delta, expires, beta):
+    """Вероятностный досрочный пересчёт (XFetch): чем ближе истечение
+    и чем дольше считается значение, тем вероятнее пересчёт."""
+    if expires is None:
+        return True
+    early = delta * beta * math.log(1.0 - random.random())
+    return time.time() - early < expires
+
+
+def get_or_set(key, compute, timeout, beta=BETA, cache='default'):
+    """Значение из кэша или результат compute().
+
+    Пересчитывает значение только один процесс: он берёт блокировку
+    через cache.add, остальные отдают прежнее значение или, если его нет,
+    ждут результат до LOCK_WAIT секунд. С общим бэкендом кэша, у которого
+    add атомарен (memcached, core.cache_backends.FileBasedCache), это
+    работает и между процессами."""
+    cache = caches[cache]
+    lock_key = key + LOCK_SUFFIX
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires = entry
+        if _is_fresh(delta, expires, beta):
+            return value
+        if not cache.add(lock_key, True, LOCK_TIMEOUT):
+            return value
+    elif not cache.add(lock_key, True, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return _store(cache, key, compute, timeout)
+    try:
+        return _store(cache, key, compute, timeout)
+    finally:
+        cache.delete(lock_key)
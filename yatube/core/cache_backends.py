@@ -0,0 +1,31 @@
+import os
+
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.files import locks
+
+ADD_LOCK_FILE = 'add.lock'
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """FileBasedCache с атомарным add.
+
+    В Django add — это has_key(), а затем set(): несколько процессов
+    могут одновременно получить True и, например, все пересчитать одну
+    страницу (core.cache.get_or_set). Здесь проверка и запись идут под
+    исключительной блокировкой файла в каталоге кэша, общей для всех
+    процессов: True получает ровно один. Имя файла блокировки без
+    суффикса .djcache, поэтому clear и вытеснение его не трогают."""
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        with open(os.path.join(self._dir, ADD_LOCK_FILE), 'ab') as lock:
+            locks.lock(lock, locks.LOCK_EX)
+            try:
+                # has_key удаляет истёкшую запись
+                if self.has_key(key, version):
+                    return False
+                self.set(key, value, timeout, version)
+                return True
+            finally:
+                locks.unlock(lock)
@@ -0,0 +1,56 @@
+"""SQLite с настройкой соединения.
+
+В OPTIONS базы, кроме параметров sqlite3.connect, понимаются:
+pragmas — {имя: значение}, выполняются при каждом новом соединении,
+например {'journal_mode': 'wal', 'busy_timeout': 5000};
+transaction_mode — DEFERRED (как у Django), IMMEDIATE или EXCLUSIVE.
+При IMMEDIATE транзакция сразу берёт блокировку записи и ждёт её
+busy_timeout, а не падает с database is locked, когда читающая
+транзакция позже пытается писать."""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+PRAGMA_VALUE = re.compile(r'-?\d+|[A-Za-z_]+')
+
+
+def pragma_statements(pragmas):
+    statements = []
+    for name, value in pragmas.items():
+        value = str(value)
+        if not name.isidentifier() or not PRAGMA_VALUE.fullmatch(value):
+            raise ImproperlyConfigured(
+                f'Некорректная прагма SQLite: {name} = {value}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get(
+            'transaction_mode', 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из '
+                f'{", ".join(TRANSACTION_MODES)}')
+        return mode
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in pragma_statements(
+                self.settings_dict['OPTIONS'].get('pragmas', {})):
+            conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,70 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import profiling
+from .routers import replica_reads, track_writes
+
+PIN_COOKIE = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """Отправляет чтение в безопасных запросах на реплики.
+
+    После запроса, который что-то записал в базу, пользователь на
+    DATABASE_REPLICA_PIN секунд закрепляется за основной базой
+    (read-your-writes): например, после создания поста или подписки
+    редирект на профиль показывает изменения, даже если реплика ещё
+    отстаёт. Запись отмечает роутер, метод запроса не важен:
+    подписка, например, делается через GET."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with track_writes() as writes:
+            if (request.method in SAFE_METHODS
+                    and PIN_COOKIE not in request.COOKIES):
+                with replica_reads():
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+        if writes.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.DATABASE_REPLICA_PIN,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует долю PROFILING_SAMPLE_RATE запросов: число и время
+    SQL-запросов, повторы, время шаблонов и миниатюр.
+
+    Для представлений из PROFILING_NAMESPACES результат отдаётся
+    в заголовке Server-Timing и копится в гистограммах процесса
+    (core.profiling.snapshot)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.sampled():
+            return self.get_response(request)
+        start = time.perf_counter()
+        with profiling.profiling() as profile, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(profiling.record_query))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        if match and match.namespace in settings.PROFILING_NAMESPACES:
+            response['Server-Timing'] = profile.server_timing(total)
+            profile.observe(match.view_name, total)
+        return response
@@ -1,9 +1,253 @@
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+import binascii
+import heapq
+from datetime import datetime
 
+from django.core.paginator import (
+    EmptyPage, Page, PageNotAnInteger, Paginator
+)
+from django.db.models import Q
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
-def paginate(request, queryset, count_per_page):
+CURSOR_PARAM = 'cursor'
+PAGE_PARAM = 'page'
+# Сколько номеров выводится вокруг текущей страницы и по краям
+PAGE_WINDOW = 2
+PAGE_ENDS = 1
+CURSOR_ORDERING = ('-pub_date', '-id')
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+CURSOR_SEPARATOR = '|'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def keyset_condition(ordering, values):
+    """Условие «строго после ключа values» для порядка ordering.
+    Нестрогая граница по первому полю позволяет базе искать по индексу
+    диапазоном, а не фильтровать весь просмотр."""
+    first = ordering[0]
+    bound = 'lte' if first.startswith('-') else 'gte'
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for prev_field, value in zip(ordering[:position], values):
+            step &= Q(**{prev_field.lstrip('-'): value})
+        condition |= step
+    return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация: страница выбирается по значениям ключа
+    последней (или первой) записи, без COUNT и OFFSET."""
+    is_cursor = True
+    count = None
+    num_pages = None
+    page_range = ()
+
+    def __init__(self, object_list, per_page, ordering=CURSOR_ORDERING):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in self.ordering)
+
+    def key(self, obj):
+        return tuple(getattr(obj, name) for name in self.fields)
+
+    def encode_cursor(self, obj, direction):
+        values = [
+            value.isoformat() if isinstance(value, datetime) else str(value)
+            for value in self.key(obj)
+        ]
+        raw = CURSOR_SEPARATOR.join([direction] + values)
+        return urlsafe_base64_encode(force_bytes(raw))
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = force_str(urlsafe_base64_decode(cursor))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise InvalidCursor(cursor)
+        direction, *values = raw.split(CURSOR_SEPARATOR)
+        if (
+            direction not in (CURSOR_NEXT, CURSOR_PREVIOUS)
+            or len(values) != len(self.fields)
+        ):
+            raise InvalidCursor(cursor)
+        try:
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except Exception:
+            raise InvalidCursor(cursor)
+        if any(value is None for value in values):
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def page(self, cursor=None):
+        if not cursor:
+            rows = self._seek()
+            has_next, has_previous = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        else:
+            direction, values = self.decode_cursor(cursor)
+            if direction == CURSOR_NEXT:
+                rows = self._seek(values)
+                has_next, has_previous = len(rows) > self.per_page, True
+                rows = rows[:self.per_page]
+            else:
+                rows = self._seek(values, reverse=True)
+                has_next, has_previous = True, len(rows) > self.per_page
+                rows = rows[:self.per_page][::-1]
+        return self._build_page(rows, has_next, has_previous)
+
+    def _field(self, name):
+        return self.object_list.model._meta.get_field(name)
+
+    def _seek(self, values=None, reverse=False):
+        """Выбирает per_page + 1 записей после ключа values
+        (или перед ним при reverse=True)."""
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            )
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(keyset_condition(ordering, values))
+        return list(queryset[:self.per_page + 1])
+
+    def _build_page(self, rows, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(rows[-1], CURSOR_NEXT)
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(rows[0], CURSOR_PREVIOUS)
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Keyset-пагинация по нескольким источникам с ключами одного вида.
+    Каждый источник отдаёт не больше страницы, страницы сливаются
+    k-way merge, совпадающие ключи выводятся один раз."""
+
+    def __init__(self, sources, per_page):
+        self.sources = [
+            CursorPaginator(queryset, per_page, ordering)
+            for queryset, ordering in sources
+        ]
+        first = self.sources[0]
+        super().__init__(first.object_list, per_page, first.ordering)
+
+    def key(self, obj):
+        for source in self.sources:
+            if isinstance(obj, source.object_list.model):
+                return source.key(obj)
+        raise TypeError(f'{obj!r} не принадлежит ни одному источнику')
+
+    def _seek(self, values=None, reverse=False):
+        descending = self.ordering[0].startswith('-') != reverse
+        merged = heapq.merge(
+            *(source._seek(values, reverse) for source in self.sources),
+            key=self.key,
+            reverse=descending,
+        )
+        rows = []
+        previous_key = None
+        for obj in merged:
+            key = self.key(obj)
+            if key == previous_key:
+                continue
+            previous_key = key
+            rows.append(obj)
+            if len(rows) > self.per_page:
+                break
+        return rows
+
+
+class CursorPage(Page):
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def page_window(number, num_pages, on_each_side=PAGE_WINDOW,
+                on_ends=PAGE_ENDS):
+    """Номера страниц для навигации: on_ends первых и последних
+    и on_each_side вокруг текущей, None на месте пропуска.
+    Длина не зависит от числа страниц."""
+    window = []
+    previous = 0
+    for start, end in (
+        (1, on_ends),
+        (number - on_each_side, number + on_each_side),
+        (num_pages - on_ends + 1, num_pages),
+    ):
+        start, end = max(start, previous + 1), min(end, num_pages)
+        if start > end:
+            continue
+        if start == previous + 2:
+            window.append(previous + 1)
+        elif start > previous + 2:
+            window.append(None)
+        window.extend(range(start, end + 1))
+        previous = end
+    return window
+
+
+class Navigation:
+    """Навигация по страницам page: окно номеров и форма перехода
+    для постраничного вывода, «Первая/Предыдущая/Следующая» для
+    курсорного. Остальные параметры запроса query сохраняются."""
+
+    def __init__(self, page, query):
+        self.page = page
+        params = query.copy()
+        for name in (PAGE_PARAM, CURSOR_PARAM):
+            params.pop(name, None)
+        self.params = params.urlencode() + '&' if params else ''
+        self.hidden = [
+            (name, value)
+            for name, values in params.lists() for value in values
+        ]
+        self.is_cursor = getattr(page.paginator, 'is_cursor', False)
+        self.pages = () if self.is_cursor else page_window(
+            page.number, page.paginator.num_pages)
+
+
+def paginate(request, queryset, count_per_page, count=None,
+             ordering=CURSOR_ORDERING):
+    """Постраничный вывод. Если в запросе передан параметр cursor,
+    используется keyset-пагинация по полям ordering.
+    Заранее известное число объектов count избавляет от COUNT-запроса."""
+    if CURSOR_PARAM in request.GET:
+        return paginate_cursor(request, queryset, count_per_page, ordering)
+    return paginate_pages(request, queryset, count_per_page, count)
+
+
+def paginate_pages(request, queryset, count_per_page, count=None):
+    """Постраничный вывод по номеру страницы, параметр cursor
+    не учитывается: для выборок, чей порядок не задаётся ключом
+    записи (например, по релевантности)."""
     paginator = Paginator(queryset, count_per_page)
-    page = request.GET.get('page')
+    if count is not None:
+        paginator.count = count
+    page = request.GET.get(PAGE_PARAM)
     try:
         paginated_queryset = paginator.page(page)
     except PageNotAnInteger:
@@ -11,3 +255,35 @@ def paginate(request, queryset, count_per_page):
     except EmptyPage:
         paginated_queryset = paginator.page(paginator.num_pages)
     return paginated_queryset
+
+
+def paginate_cursor(request, queryset, count_per_page,
+                    ordering=CURSOR_ORDERING):
+    """Keyset-пагинация; без курсора или с некорректным курсором
+    открывается первая страница."""
+    paginator = CursorPaginator(queryset, count_per_page, ordering)
+    try:
+        return paginator.page(request.GET.get(CURSOR_PARAM))
+    except InvalidCursor:
+        return paginator.page()
+
+
+def next_cursor(page, ordering=CURSOR_ORDERING):
+    """Курсор следующей страницы после page. Для постраничного вывода
+    строится по последнему объекту, чтобы дальше листать курсором."""
+    if isinstance(page, CursorPage):
+        return page.next_cursor
+    if not page.has_next():
+        return None
+    paginator = CursorPaginator(
+        page.paginator.object_list, page.paginator.per_page, ordering)
+    return paginator.encode_cursor(page[len(page) - 1], CURSOR_NEXT)
+
+
+def paginate_merged(request, sources, count_per_page):
+    """Keyset-пагинация по нескольким (queryset, ordering)."""
+    paginator = MergedCursorPaginator(sources, count_per_page)
+    try:
+        return paginator.page(request.GET.get(CURSOR_PARAM))
+    except InvalidCursor:
+        return paginator.page()
@@ -0,0 +1,161 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Границы корзин гистограммы, в миллисекундах (или штуках для
+# счётчиков запросов); последняя корзина — всё, что больше.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+# Метрики времени кроме SQL: отрисовка шаблонов и миниатюры
+TIMERS = ('tpl', 'thumb')
+
+_current = ContextVar('profile', default=None)
+_histograms = defaultdict(lambda: defaultdict(Histogram))
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами BUCKETS."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, percent):
+        """Верхняя граница корзины, в которую попал перцентиль;
+        None, если он в последней, неограниченной корзине."""
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': dict(zip(map(str, BUCKETS + ('inf',)), self.counts)),
+        }
+
+
+class Profile:
+    """Стоимость одного запроса: SQL, шаблоны, миниатюры."""
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.queries = []
+        self._depth = Counter()
+
+    def record_query(self, sql, params, duration):
+        self.queries.append((sql, repr(params)))
+        self.timings['db'] += duration
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторили уже выполненный
+        с теми же параметрами."""
+        return len(self.queries) - len(set(self.queries))
+
+    def server_timing(self, total):
+        metrics = [
+            f'db;dur={self.timings["db"] * 1000:.1f};'
+            f'desc="{len(self.queries)} queries"',
+            f'dup;desc="{self.duplicates} duplicate queries"',
+        ]
+        metrics += [
+            f'{name};dur={self.timings[name] * 1000:.1f}'
+            for name in TIMERS if name in self.timings
+        ]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def observe(self, view, total):
+        observe(view, 'total', total * 1000)
+        observe(view, 'queries', len(self.queries))
+        observe(view, 'duplicates', self.duplicates)
+        for name in ('db',) + TIMERS:
+            observe(view, name, self.timings[name] * 1000)
+
+
+@contextmanager
+def profiling():
+    """Собирает Profile для кода внутри блока."""
+    profile = Profile()
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+
+
+def sampled():
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper, учитывающий запрос в текущем профиле."""
+    profile = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if profile is not None:
+            profile.record_query(sql, params, time.perf_counter() - start)
+
+
+@contextmanager
+def timer(name):
+    """Добавляет время блока к метрике name текущего профиля.
+    Вложенные блоки одной метрики не учитываются дважды."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile._depth[name] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile._depth[name] -= 1
+        if not profile._depth[name]:
+            profile.timings[name] += time.perf_counter() - start
+
+
+def observe(view, metric, value):
+    with _lock:
+        _histograms[view][metric].observe(value)
+
+
+def snapshot():
+    """Гистограммы всех представлений этого процесса."""
+    with _lock:
+        return {
+            view: {
+                metric: histogram.as_dict()
+                for metric, histogram in metrics.items()
+            }
+            for view, metrics in _histograms.items()
+        }
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
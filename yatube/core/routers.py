@@ -0,0 +1,78 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Можно ли читать с реплики в текущем запросе. Вне запросов
+# (команды, миграции, фоновые потоки) всё идёт на основную базу.
+_replica_reads = ContextVar('replica_reads', default=False)
+# Отметка о записи в текущем запросе, см. track_writes
+_writes = ContextVar('writes', default=None)
+
+
+@contextmanager
+def replica_reads():
+    """Разрешает чтение с реплик внутри блока."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class Writes:
+    wrote = False
+
+
+@contextmanager
+def track_writes():
+    """Отмечает в возвращаемом объекте (wrote), была ли внутри
+    блока запись в базу, независимо от метода запроса."""
+    writes = Writes()
+    token = _writes.set(writes)
+    try:
+        yield writes
+    finally:
+        _writes.reset(token)
+
+
+def use_primary():
+    """Дальше в этом контексте читать только с основной базы."""
+    _replica_reads.set(False)
+    writes = _writes.get()
+    if writes is not None:
+        writes.wrote = True
+
+
+def replicas():
+    return [
+        alias for alias in settings.DATABASE_REPLICAS
+        if alias in settings.DATABASES
+    ]
+
+
+class PrimaryReplicaRouter:
+    """Запись идёт в основную базу, чтение в разрешённом контексте —
+    на случайную реплику. После первой записи контекст до конца
+    читает с основной базы, чтобы видеть свои изменения."""
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if _replica_reads.get() and aliases:
+            return random.choice(aliases)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        use_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS or None
@@ -0,0 +1,25 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .profiling import timer
+
+
+class ProfiledTemplate(Template):
+
+    def render(self, context=None, request=None):
+        with timer('tpl'):
+            return super().render(context, request)
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, учитывающий время отрисовки в профиле запроса."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
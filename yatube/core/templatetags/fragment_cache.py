@@ -0,0 +1,43 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.cache import get_or_set
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+
+    def __init__(self, nodelist, expire_time, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.expire_time = expire_time
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.expire_time.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        return get_or_set(
+            key, lambda: self.nodelist.render(context), timeout)
+
+
+@register.tag
+def cache_fragment(parser, token):
+    """Как {% cache %}, но фрагмент пересчитывает только один процесс.
+
+    {% cache_fragment timeout name [vary_on ...] %} ...
+    {% endcache_fragment %}
+    """
+    nodelist = parser.parse(('endcache_fragment',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]} принимает минимум два аргумента.')
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2].strip('\'"'),
+        [parser.compile_filter(token) for token in tokens[3:]],
+    )
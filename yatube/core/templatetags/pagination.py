@@ -0,0 +1,17 @@
+from django import template
+
+from core import pagination
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_navigation(context, page_obj):
+    """{% page_navigation page_obj as nav %}"""
+    return pagination.Navigation(page_obj, context['request'].GET)
+
+
+@register.simple_tag
+def next_cursor(page_obj):
+    """{% next_cursor page_obj as cursor %}"""
+    return pagination.next_cursor(page_obj)
@@ -6,3 +6,8 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.filter
+def get(mapping, key):
+    return mapping.get(key)
@@ -0,0 +1,154 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core import cache as stampede
+from core.cache import get_or_set
+
+
+class GetOrSetTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_is_computed_once(self):
+        """Значение считается один раз и берётся из кэша."""
+        self.assertEqual(get_or_set('key', self.compute, 60), 1)
+        self.assertEqual(get_or_set('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи пересчитывает только один поток."""
+        def slow_compute():
+            time.sleep(0.2)
+            return self.compute()
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    get_or_set('key', slow_compute, 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [1] * 8)
+
+    def test_expiring_value_is_recomputed_early(self):
+        """Истекающее значение пересчитывается до удаления из кэша."""
+        get_or_set('key', self.compute, 60)
+        with mock.patch.object(stampede, '_is_fresh', return_value=False):
+            self.assertEqual(get_or_set('key', self.compute, 60), 2)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой процесс пересчитывает, отдаётся прежнее значение."""
+        get_or_set('key', self.compute, 60)
+        cache.add('key' + stampede.LOCK_SUFFIX, True)
+        with mock.patch.object(stampede, '_is_fresh', return_value=False):
+            self.assertEqual(get_or_set('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_recompute_probability_grows_near_expiry(self):
+        """Досрочный пересчёт наступает только вблизи истечения."""
+        now = time.time()
+        self.assertTrue(stampede._is_fresh(0.1, now + 3600, 1.0))
+        self.assertFalse(stampede._is_fresh(0.1, now - 1, 1.0))
+
+
+class FileBasedCacheTest(SimpleTestCase):
+    """Общий между процессами кэш core.cache_backends.FileBasedCache."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'shared': {
+                'BACKEND': 'core.cache_backends.FileBasedCache',
+                'LOCATION': directory,
+            },
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def run_threads(self, target, number=16):
+        """target в number потоках, стартующих одновременно; у каждого
+        потока свой экземпляр бэкенда, как у отдельного процесса."""
+        barrier = threading.Barrier(number)
+        results = []
+
+        def run():
+            shared = caches['shared']
+            barrier.wait()
+            results.append(target(shared))
+
+        threads = [threading.Thread(target=run) for _ in range(number)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_add_is_atomic(self):
+        """Из одновременных add успешен ровно один."""
+        results = self.run_threads(lambda shared: shared.add('lock', 1, 60))
+        self.assertEqual(results.count(True), 1)
+
+    def test_add_replaces_expired(self):
+        """Истёкшая запись не мешает add."""
+        shared = caches['shared']
+        shared.set('lock', 1, 0)
+        self.assertTrue(shared.add('lock', 2, 60))
+        self.assertFalse(shared.add('lock', 3, 60))
+        self.assertEqual(shared.get('lock'), 2)
+
+    def test_concurrent_misses_compute_once(self):
+        """get_or_set с общим кэшем пересчитывает значение один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = self.run_threads(
+            lambda shared: get_or_set('key', compute, 60, cache='shared'),
+            number=8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 8)
+
+
+class CacheFragmentTagTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fragment_is_cached(self):
+        """Фрагмент берётся из кэша, пока не изменился vary_on."""
+        template = Template(
+            '{% load fragment_cache %}'
+            '{% cache_fragment 60 "name" version %}{{ text }}'
+            '{% endcache_fragment %}'
+        )
+        self.assertEqual(
+            template.render(Context({'text': 'old', 'version': 1})), 'old')
+        self.assertEqual(
+            template.render(Context({'text': 'new', 'version': 1})), 'old')
+        self.assertEqual(
+            template.render(Context({'text': 'new', 'version': 2})), 'new')
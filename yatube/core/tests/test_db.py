@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.test import SimpleTestCase
+
+from core.db_backends.sqlite3.base import DatabaseWrapper
+
+
+class SQLiteBackendTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = os.path.join(directory.name, 'db.sqlite3')
+
+    def wrapper(self, **options):
+        wrapper = DatabaseWrapper({
+            'NAME': self.name, 'OPTIONS': options, 'AUTOCOMMIT': True,
+            'TIME_ZONE': None, 'CONN_MAX_AGE': 0,
+        }, alias='sqlite-test')
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        return wrapper.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        """Прагмы из OPTIONS выполняются для каждого соединения."""
+        wrapper = self.wrapper(pragmas={
+            'journal_mode': 'wal', 'synchronous': 'normal',
+            'busy_timeout': 1234, 'cache_size': -8000,
+        })
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 1234)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -8000)
+        wrapper.close()
+        wrapper.ensure_connection()
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 1234)
+
+    def test_invalid_pragma(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.wrapper(pragmas={'journal_mode': 'wal; DROP TABLE x'})
+
+    def test_immediate_transaction_takes_write_lock(self):
+        """Транзакция IMMEDIATE блокирует запись с самого начала."""
+        pragmas = {'journal_mode': 'wal', 'busy_timeout': 0}
+        first = self.wrapper(pragmas=pragmas, transaction_mode='immediate')
+        second = self.wrapper(pragmas=pragmas)
+        first._start_transaction_under_autocommit()
+        self.assertTrue(first.connection.in_transaction)
+        with self.assertRaises(OperationalError):
+            second.cursor().execute('CREATE TABLE note (id integer)')
+        first.connection.rollback()
+        second.cursor().execute('CREATE TABLE note (id integer)')
@@ -0,0 +1,53 @@
+from django.core.paginator import Paginator
+from django.http import QueryDict
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase
+
+from core.pagination import Navigation, page_window
+
+
+class PageWindowTest(SimpleTestCase):
+
+    def test_window(self):
+        """Первая, последняя и по две вокруг текущей, пропуски — None."""
+        cases = {
+            (1, 1): [1],
+            (1, 5): [1, 2, 3, 4, 5],
+            (1, 100): [1, 2, 3, None, 100],
+            (50, 100): [1, None, 48, 49, 50, 51, 52, None, 100],
+            (100, 100): [1, None, 98, 99, 100],
+            (5, 100): [1, 2, 3, 4, 5, 6, 7, None, 100],
+        }
+        for (number, num_pages), expected in cases.items():
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(page_window(number, num_pages), expected)
+
+    def test_window_size_is_bounded(self):
+        """Длина окна не растёт с числом страниц."""
+        self.assertEqual(len(page_window(50_000, 100_000)), 9)
+        self.assertEqual(len(page_window(50_000, 100_000, 5, 2)), 17)
+
+
+class NavigationTest(SimpleTestCase):
+
+    def render(self, page, query=''):
+        request = RequestFactory().get('/', QueryDict(query))
+        return Template(
+            "{% include 'posts/includes/paginator.html' %}"
+        ).render(Context({'page_obj': page, 'request': request}))
+
+    def test_other_params_kept(self):
+        """Ссылки и форма перехода сохраняют остальные параметры."""
+        page = Paginator(range(1000), 10).page(50)
+        navigation = Navigation(page, QueryDict('q=кот&page=50&cursor=x'))
+        self.assertEqual(navigation.params, 'q=%D0%BA%D0%BE%D1%82&')
+        self.assertEqual(navigation.hidden, [('q', 'кот')])
+
+    def test_large_paginator_renders_window(self):
+        """Для 100 000 страниц выводится фиксированное число ссылок
+        и форма перехода."""
+        html = self.render(Paginator(range(1_000_000), 10).page(500), 'q=1')
+        self.assertEqual(html.count('class="page-link" href'), 8)
+        self.assertIn('href="?q=1&amp;page=100000"', html)
+        self.assertIn('name="page"', html)
+        self.assertIn('<input type="hidden" name="q" value="1">', html)
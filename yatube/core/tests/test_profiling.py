@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import profiling
+from core.tests.utils import TempMediaRootMixin
+from posts.models import Post
+
+User = get_user_model()
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class ProfileTest(SimpleTestCase):
+
+    def test_duplicates(self):
+        """Повтором считается тот же запрос с теми же параметрами."""
+        profile = profiling.Profile()
+        profile.record_query('SELECT %s', (1,), 0.001)
+        profile.record_query('SELECT %s', (1,), 0.001)
+        profile.record_query('SELECT %s', (2,), 0.001)
+        self.assertEqual(profile.duplicates, 1)
+        timing = profile.server_timing(0.01)
+        self.assertIn('3 queries', timing)
+        self.assertIn('1 duplicate', timing)
+
+    def test_nested_timers_counted_once(self):
+        """Вложенные блоки одной метрики не суммируются."""
+        with profiling.profiling() as profile:
+            with profiling.timer('tpl'):
+                with profiling.timer('tpl'):
+                    pass
+        self.assertEqual(len(profile.timings), 1)
+
+    def test_histogram_percentiles(self):
+        """Перцентиль — верхняя граница корзины."""
+        histogram = profiling.Histogram()
+        for value in (0.5, 3, 3, 40, 10000):
+            histogram.observe(value)
+        self.assertEqual(histogram.percentile(50), 5)
+        self.assertEqual(histogram.percentile(80), 50)
+        self.assertIsNone(histogram.percentile(100))
+        self.assertEqual(histogram.as_dict()['count'], 5)
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class ProfilingMiddlewareTest(TempMediaRootMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+
+    def test_server_timing(self):
+        """Страницы posts отдают SQL, шаблоны и миниатюры
+        в Server-Timing."""
+        response = self.client.get(reverse('posts:index'))
+        metrics = [
+            metric.split(';')[0]
+            for metric in response['Server-Timing'].split(', ')
+        ]
+        self.assertEqual(metrics, ['db', 'dup', 'tpl', 'thumb', 'total'])
+        self.assertIn('queries', response['Server-Timing'])
+
+    def test_histogram(self):
+        """Профили копятся в гистограммах по имени представления."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        stats = profiling.snapshot()['posts:index']
+        self.assertEqual(stats['total']['count'], 2)
+        self.assertEqual(stats['queries']['count'], 2)
+
+    def test_other_namespaces_not_profiled(self):
+        """Страницы вне PROFILING_NAMESPACES не профилируются."""
+        response = self.client.get(reverse('about:tech'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(profiling.snapshot(), {})
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_sampling(self):
+        """Запросы вне выборки не профилируются."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_stats_for_staff_only(self):
+        """Гистограммы видны только персоналу."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('profiling'))
+        self.assertEqual(response.status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('profiling'))
+        self.assertIn('posts:index', response.json())
@@ -0,0 +1,123 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from core.middleware import PIN_COOKIE
+from core.routers import (
+    PrimaryReplicaRouter, replica_reads, track_writes
+)
+from posts.models import Post
+
+User = get_user_model()
+REPLICA = 'replica'
+
+
+@mock.patch('core.routers.replicas', return_value=[REPLICA])
+class PrimaryReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_outside_requests_use_primary(self, replicas):
+        """Вне запросов чтение идёт с основной базы."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_reads_use_replica(self, replicas):
+        """В разрешённом контексте чтение идёт с реплики."""
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Post), REPLICA)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_reads_after_write_use_primary(self, replicas):
+        """После записи контекст читает с основной базы."""
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_writes_are_tracked(self, replicas):
+        """track_writes отмечает запись, чтение её не отмечает."""
+        with track_writes() as writes:
+            self.router.db_for_read(Post)
+            self.assertFalse(writes.wrote)
+            self.router.db_for_write(Post)
+        self.assertTrue(writes.wrote)
+
+
+class ReplicaRoutingMiddlewareTest(TestCase):
+    """Основная база и реплика — два разных файла sqlite,
+    реплика отстаёт: в неё ничего не копируется."""
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': cls.replica_path,
+        }
+        connections.ensure_defaults(REPLICA)
+        connections.prepare_test_settings(REPLICA)
+        cls.replicas = mock.patch(
+            'core.routers.replicas', return_value=[REPLICA])
+        cls.replicas.start()
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.replicas.stop()
+        connections[REPLICA].close()
+        del connections.databases[REPLICA]
+        delattr(connections._connections, REPLICA)
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='auth')
+        User.objects.using(REPLICA).create(
+            id=self.author.id, username=self.author.username,
+            password=self.author.password)
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def profile_posts(self):
+        response = self.client.get(
+            reverse('posts:profile', args=(self.author.username,)))
+        return list(response.context['page_obj'])
+
+    def test_author_sees_own_post_after_create(self):
+        """После создания поста автор читает с основной базы
+        и видит новый пост, хотя реплика его ещё не получила."""
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            [post.text for post in self.profile_posts()], ['Новый пост'])
+
+    def test_follower_sees_follow_after_redirect(self):
+        """Подписка пишет через GET, но тоже закрепляет за основной
+        базой: профиль после редиректа показывает подписку."""
+        other = User.objects.create_user(username='other')
+        User.objects.using(REPLICA).create(
+            id=other.id, username=other.username)
+        # Сессия входа давно доехала до реплики, подписка — нет
+        Session.objects.get(
+            session_key=self.client.session.session_key).save(using=REPLICA)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=(other.username,)),
+            follow=True)
+        self.assertIn(PIN_COOKIE, self.client.cookies)
+        self.assertTrue(response.context['following'])
+
+    def test_reads_go_to_replica(self):
+        """Без недавней записи страницы читают с реплики."""
+        Post.objects.create(author=self.author, text='Ещё не на реплике')
+        self.assertEqual(self.profile_posts(), [])
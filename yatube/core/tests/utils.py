@@ -0,0 +1,46 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+
+
+def make_image(size=(40, 20), name='image.png', image_format='PNG',
+               exif=None):
+    """Загружаемая картинка size в формате image_format."""
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(
+        buffer, image_format, **({'exif': exif} if exif else {}))
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), Image.MIME[image_format])
+
+
+class TempMediaRootMixin:
+    """MEDIA_ROOT класса тестов — временный каталог вне проекта.
+    Создаётся перед тестами класса и удаляется после них."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media_root_override = override_settings(
+            MEDIA_ROOT=cls.media_root)
+        cls._media_root_override.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._remove_media_root()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls._remove_media_root()
+
+    @classmethod
+    def _remove_media_root(cls):
+        cls._media_root_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
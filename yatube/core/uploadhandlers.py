@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.files.uploadhandler import (
+    StopUpload, TemporaryFileUploadHandler
+)
+
+
+def too_large_uploads(request):
+    """Поля, загрузка файлов в которые прервана
+    на FILE_UPLOAD_MAX_SIZE байт."""
+    return getattr(request, '_too_large_uploads', ())
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загружаемый файл во временный файл на диске частями,
+    не держа его в памяти. Как только файл превышает
+    FILE_UPLOAD_MAX_SIZE байт, разбор тела запроса прекращается
+    и остаток не читается; поле попадает в too_large_uploads,
+    по которому представление показывает ошибку формы."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.FILE_UPLOAD_MAX_SIZE:
+            self.request._too_large_uploads = (
+                *too_large_uploads(self.request), self.field_name)
+            raise StopUpload(connection_reset=True)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
@@ -0,0 +1,250 @@
+"""JSON API только для чтения: лента, группа, профиль, подписки и пост.
+
+Списки листаются курсором (параметр cursor, размер страницы — limit).
+Поля выбираются параметрами fields[post], fields[comment] и
+fields[group] через запятую, например ?fields[post]=id,text:
+связи, которые не запрошены, не подтягиваются из базы.
+Число запросов к базе указано у каждого представления
+(гость, поля по умолчанию, пустой кэш)."""
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from core.pagination import (
+    CURSOR_ORDERING, CURSOR_PARAM, CursorPaginator, InvalidCursor,
+    MergedCursorPaginator
+)
+from .comments import comments_page
+from .counters import comment_counts, profile_counts
+from .feed import FEED_ORDERING, as_posts, feed_sources
+from .models import Follow, Group, Post
+
+User = get_user_model()
+JSON_PARAMS = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+class ApiError(Exception):
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+class Resource:
+    """Компактное представление модели.
+
+    fields — {имя: (связи для select_related, значение объекта)},
+    batch_fields — {имя: значения для страницы объектов {pk: значение}},
+    например счётчики, которые читаются одним запросом на страницу."""
+
+    def __init__(self, name, fields, default, batch_fields=None):
+        self.name = name
+        self.fields = fields
+        self.batch_fields = batch_fields or {}
+        self.default = default
+
+    def requested(self, request):
+        value = request.GET.get(f'fields[{self.name}]')
+        if value is None:
+            return self.default
+        names = tuple(name for name in value.split(',') if name)
+        unknown = set(names) - set(self.fields) - set(self.batch_fields)
+        if unknown:
+            raise ApiError(
+                f'Неизвестные поля {self.name}: {", ".join(sorted(unknown))}')
+        return names
+
+    def related(self, names):
+        return {
+            relation
+            for name in names if name in self.fields
+            for relation in self.fields[name][0]
+        }
+
+    def prepare(self, queryset, names):
+        related = self.related(names)
+        return queryset.select_related(*related) if related else queryset
+
+    def serialize(self, objects, names):
+        batches = {
+            name: self.batch_fields[name](objects)
+            for name in names if name in self.batch_fields
+        }
+        return [
+            {
+                name: (
+                    batches[name][obj.pk] if name in batches
+                    else self.fields[name][1](obj)
+                )
+                for name in names
+            }
+            for obj in objects
+        ]
+
+
+POST = Resource(
+    'post',
+    {
+        'id': ((), lambda post: post.pk),
+        'text': ((), lambda post: post.text),
+        'author': (('author',), lambda post: post.author.username),
+        'group': (
+            ('group',),
+            lambda post: post.group.slug if post.group_id else None),
+        'pub_date': ((), lambda post: post.pub_date.isoformat()),
+        'image': ((), lambda post: post.image.url if post.image else None),
+    },
+    default=('id', 'text', 'author', 'group', 'pub_date', 'image'),
+    batch_fields={
+        'comments': lambda posts: comment_counts(
+            [post.pk for post in posts]),
+    },
+)
+COMMENT = Resource(
+    'comment',
+    {
+        'id': ((), lambda comment: comment.pk),
+        'author': (('author',), lambda comment: comment.author.username),
+        'text': ((), lambda comment: comment.text),
+        'pub_date': ((), lambda comment: comment.pub_date.isoformat()),
+    },
+    default=('id', 'author', 'text', 'pub_date'),
+)
+GROUP = Resource(
+    'group',
+    {
+        'id': ((), lambda group: group.pk),
+        'title': ((), lambda group: group.title),
+        'slug': ((), lambda group: group.slug),
+        'description': ((), lambda group: group.description),
+    },
+    default=('id', 'title', 'slug', 'description'),
+)
+
+
+def api_view(view):
+    """Только GET и HEAD; ошибки отдаются в JSON."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            data = view(request, *args, **kwargs)
+        except Http404:
+            data, status = {'detail': 'Не найдено'}, 404
+        except ApiError as error:
+            data, status = {'detail': error.detail}, error.status
+        else:
+            status = 200
+        return JsonResponse(
+            data, status=status, json_dumps_params=JSON_PARAMS)
+    return wrapper
+
+
+def page_size(request):
+    value = request.GET.get('limit', settings.POSTS_PER_PAGE)
+    try:
+        value = int(value)
+    except ValueError:
+        value = 0
+    if not 1 <= value <= settings.API_MAX_PAGE_SIZE:
+        raise ApiError(
+            f'limit должен быть от 1 до {settings.API_MAX_PAGE_SIZE}')
+    return value
+
+
+def cursor_page(request, paginator):
+    try:
+        return paginator.page(request.GET.get(CURSOR_PARAM))
+    except InvalidCursor:
+        raise ApiError('Некорректный курсор')
+
+
+def page_data(page, objects, resource, names):
+    return {
+        'results': resource.serialize(objects, names),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def post_page(request, queryset):
+    names = POST.requested(request)
+    page = cursor_page(request, CursorPaginator(
+        POST.prepare(queryset, names), page_size(request), CURSOR_ORDERING))
+    return page_data(page, page.object_list, POST, names)
+
+
+@api_view
+def index(request):
+    """Все посты, новые первыми. Запросов: 1, с полем comments — 2."""
+    return post_page(request, Post.objects.all())
+
+
+@api_view
+def group_posts(request, slug):
+    """Группа и её посты. Запросов: 2."""
+    group = get_object_or_404(Group, slug=slug)
+    return {
+        'group': GROUP.serialize([group], GROUP.requested(request))[0],
+        **post_page(request, group.posts.all()),
+    }
+
+
+@api_view
+def profile(request, username):
+    """Автор, его счётчики и посты. Запросов: 3, для пользователя
+    ещё 3 (сессия, пользователь, подписка)."""
+    author = get_object_or_404(User, username=username)
+    data = {
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        **profile_counts(author.pk),
+    }
+    if request.user.is_authenticated:
+        data['following'] = Follow.objects.filter(
+            user=request.user, author=author).exists()
+    return {'author': data, **post_page(request, author.posts.all())}
+
+
+@api_view
+def follow_index(request):
+    """Посты авторов, на которых подписан пользователь.
+    Запросов: 4 (сессия, пользователь, кэшируемый список знаменитостей,
+    лента), с подписками на знаменитостей — ещё 2: эти подписки и посты
+    всех таких авторов одним запросом."""
+    if not request.user.is_authenticated:
+        raise ApiError('Требуется вход', status=401)
+    names = POST.requested(request)
+    sources = feed_sources(request.user)
+    if len(sources) > 1:
+        paginator = MergedCursorPaginator(sources, page_size(request))
+    else:
+        paginator = CursorPaginator(
+            sources[0][0], page_size(request), FEED_ORDERING)
+    page = cursor_page(request, paginator)
+    return page_data(page, as_posts(page.object_list), POST, names)
+
+
+@api_view
+def post_detail(request, post_id):
+    """Пост и страница комментариев к нему (cursor листает
+    комментарии). Запросов: 2, страницы комментариев кэшируются."""
+    names = POST.requested(request)
+    post = get_object_or_404(POST.prepare(Post.objects.all(), names),
+                             pk=post_id)
+    try:
+        comments = comments_page(
+            post.pk, request.GET.get(CURSOR_PARAM), strict=True)
+    except InvalidCursor:
+        raise ApiError('Некорректный курсор')
+    return {
+        'post': POST.serialize([post], names)[0],
+        'comments': page_data(
+            comments, comments.object_list, COMMENT,
+            COMMENT.requested(request)),
+    }
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from core.pagination import CursorPage, CursorPaginator, InvalidCursor
+from . import versions
+from .models import Comment
+
+COMMENT_ORDERING = ('pub_date', 'id')
+PAGE_KEY = 'posts:comments:{}:{}:{}'
+
+
+def comments_paginator(post_id):
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        COMMENT_ORDERING,
+    )
+
+
+def comments_page(post_id, cursor=None, strict=False):
+    """Страница комментариев поста по курсору, старые первыми.
+    Некорректный курсор открывает первую страницу, а при strict=True
+    вызывает InvalidCursor.
+
+    Страницы кэшируются. Полная страница, за которой есть следующая,
+    больше не меняется, пока комментарии не правят и не удаляют.
+    Последняя страница дополнительно привязана к версии хвоста,
+    которую сдвигает каждый новый комментарий."""
+    paginator = comments_paginator(post_id)
+    if cursor:
+        try:
+            paginator.decode_cursor(cursor)
+        except InvalidCursor:
+            if strict:
+                raise
+            cursor = None
+    tail_version = versions.version(versions.comments_tail_scope(post_id))
+    key = PAGE_KEY.format(
+        post_id,
+        versions.version(versions.comments_scope(post_id)),
+        cursor or '',
+    )
+    cached = cache.get(key)
+    if cached is not None and cached[-1] in (None, tail_version):
+        comments, next_cursor, previous_cursor, _ = cached
+        return CursorPage(comments, paginator, next_cursor, previous_cursor)
+    page = paginator.page(cursor)
+    cache.set(
+        key,
+        (
+            list(page.object_list),
+            page.next_cursor,
+            page.previous_cursor,
+            None if page.has_next() else tail_version,
+        ),
+        settings.POST_LIST_CACHE_TIMEOUT,
+    )
+    return page
+
+
+def expire_tail(post_id):
+    """Новый комментарий меняет только последнюю страницу."""
+    versions.bump(versions.comments_tail_scope(post_id))
+
+
+def expire_all(post_id):
+    versions.bump(versions.comments_scope(post_id))
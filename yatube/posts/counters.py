@@ -0,0 +1,193 @@
+from django.db.models import Count, F
+
+from .models import Comment, Counter, Follow, Post
+
+POSTS_TOTAL = 'posts'
+
+
+def author_posts(author_id):
+    return f'posts:author:{author_id}'
+
+
+def group_posts(group_id):
+    return f'posts:group:{group_id}'
+
+
+def author_followers(author_id):
+    return f'followers:{author_id}'
+
+
+def author_following(user_id):
+    return f'following:{user_id}'
+
+
+def post_comments(post_id):
+    return f'comments:{post_id}'
+
+
+# Семейства счётчиков по объектам: префикс имени, модель
+# и поле, по которому группируются строки
+FAMILIES = (
+    ('posts:author:', Post, 'author_id'),
+    ('posts:group:', Post, 'group_id'),
+    ('followers:', Follow, 'author_id'),
+    ('following:', Follow, 'user_id'),
+    ('comments:', Comment, 'post_id'),
+)
+
+
+def get_count(name, queryset):
+    """Значение счётчика; при первом обращении считается по queryset."""
+    value = Counter.objects.filter(name=name).values_list(
+        'value', flat=True).first()
+    if value is None:
+        value = Counter.objects.get_or_create(
+            name=name, defaults={'value': queryset.count()})[0].value
+    return value
+
+
+def get_counts(querysets):
+    """Значения нескольких счётчиков {имя: queryset} одним запросом;
+    отсутствующие считаются по своим queryset."""
+    values = dict(Counter.objects.filter(
+        name__in=querysets).values_list('name', 'value'))
+    missing = {
+        name: queryset.count()
+        for name, queryset in querysets.items() if name not in values
+    }
+    values.update(_store(missing))
+    return values
+
+
+def _store(computed):
+    """Сохраняет посчитанные счётчики, не затирая созданные
+    параллельно, и возвращает сохранённые значения."""
+    if not computed:
+        return {}
+    Counter.objects.bulk_create(
+        [Counter(name=name, value=value) for name, value in computed.items()],
+        ignore_conflicts=True,
+    )
+    return dict(Counter.objects.filter(
+        name__in=computed).values_list('name', 'value'))
+
+
+def increment(name, delta=1):
+    """Атомарно меняет существующий счётчик.
+    Отсутствующий счётчик будет посчитан при первом чтении."""
+    Counter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def start(name, value=0):
+    """Заводит счётчик с известным значением, если его ещё нет."""
+    Counter.objects.bulk_create(
+        [Counter(name=name, value=value)], ignore_conflicts=True)
+
+
+def reset(name):
+    Counter.objects.filter(name=name).delete()
+
+
+def post_count(author_id=None, group_id=None):
+    """Число постов всего, у автора или в группе."""
+    if author_id is not None:
+        return get_count(
+            author_posts(author_id), Post.objects.filter(author_id=author_id))
+    if group_id is not None:
+        return get_count(
+            group_posts(group_id), Post.objects.filter(group_id=group_id))
+    return get_count(POSTS_TOTAL, Post.objects.all())
+
+
+def follower_count(author_id):
+    """Число подписчиков автора."""
+    return get_count(
+        author_followers(author_id),
+        Follow.objects.filter(author_id=author_id),
+    )
+
+
+def following_count(user_id):
+    """Число авторов, на которых подписан пользователь."""
+    return get_count(
+        author_following(user_id),
+        Follow.objects.filter(user_id=user_id),
+    )
+
+
+def profile_counts(author_id):
+    """Число постов, подписчиков и подписок автора одним запросом."""
+    values = get_counts({
+        author_posts(author_id): Post.objects.filter(author_id=author_id),
+        author_followers(author_id):
+            Follow.objects.filter(author_id=author_id),
+        author_following(author_id): Follow.objects.filter(user_id=author_id),
+    })
+    return {
+        'posts_count': values[author_posts(author_id)],
+        'followers_count': values[author_followers(author_id)],
+        'following_count': values[author_following(author_id)],
+    }
+
+
+def comment_counts(post_ids):
+    """{id поста: число комментариев}. Недостающие счётчики
+    считаются одним сгруппированным запросом."""
+    names = {post_comments(post_id): post_id for post_id in post_ids}
+    values = dict(Counter.objects.filter(
+        name__in=names).values_list('name', 'value'))
+    missing = [post_id for name, post_id in names.items()
+               if name not in values]
+    if missing:
+        computed = dict.fromkeys(missing, 0)
+        computed.update(Comment.objects.filter(
+            post_id__in=missing).values_list('post_id').annotate(
+            Count('id')).order_by())
+        values.update(_store({
+            post_comments(post_id): value
+            for post_id, value in computed.items()
+        }))
+    return {post_id: values[name] for name, post_id in names.items()}
+
+
+def _family_counts(model, field):
+    return dict(
+        model.objects.values_list(field).annotate(
+            Count('id')).order_by()
+    )
+
+
+def reconcile(dry_run=False, models=None):
+    """Сверяет сохранённые счётчики с данными и исправляет
+    расхождения; models ограничивает сверку счётчиками этих моделей.
+    Возвращает {префикс: число исправленных}."""
+    fixed = {}
+    families = []
+    if models is None or Post in models:
+        expected = {POSTS_TOTAL: Post.objects.count()}
+        families.append((POSTS_TOTAL, expected, None))
+    families += [
+        (prefix, _family_counts(model, field), prefix)
+        for prefix, model, field in FAMILIES
+        if models is None or model in models
+    ]
+    for family, actual, prefix in families:
+        counters = Counter.objects.filter(
+            name__startswith=prefix) if prefix else Counter.objects.filter(
+            name=POSTS_TOTAL)
+        drifted = []
+        for counter in counters.iterator():
+            key = counter.name
+            if prefix:
+                try:
+                    key = int(counter.name[len(prefix):])
+                except ValueError:
+                    continue
+            value = actual.get(key, 0)
+            if counter.value != value:
+                counter.value = value
+                drifted.append(counter)
+        if drifted and not dry_run:
+            Counter.objects.bulk_update(drifted, ['value'], batch_size=1000)
+        fixed[family] = len(drifted)
+    return fixed
@@ -0,0 +1,236 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+
+from core.cache import get_or_set
+from core.pagination import CURSOR_ORDERING
+from . import counters
+from .models import FeedEntry, Follow, Post
+
+FEED_ORDERING = ('-pub_date', '-post_id')
+FEED_BATCH_SIZE = 1000
+# Сколько id подставляется в один запрос набором
+FEED_IDS_BATCH_SIZE = 500
+CELEBRITIES_KEY = 'posts:feed:celebrities'
+
+
+def _celebrities_key():
+    return f'{CELEBRITIES_KEY}:{settings.FEED_CELEBRITY_FOLLOWERS}'
+
+
+def celebrities():
+    """id авторов, у которых подписчиков не меньше
+    FEED_CELEBRITY_FOLLOWERS. Их посты не рассылаются по лентам,
+    а подмешиваются при чтении."""
+    return get_or_set(_celebrities_key(), _find_celebrities, None)
+
+
+def _find_celebrities():
+    return frozenset(
+        Follow.objects.values('author').annotate(
+            followers=Count('id')).filter(
+            followers__gte=settings.FEED_CELEBRITY_FOLLOWERS,
+        ).values_list('author', flat=True)
+    )
+
+
+def reset_celebrities():
+    cache.delete(_celebrities_key())
+
+
+def is_celebrity(author_id):
+    return author_id in celebrities()
+
+
+def update_celebrity(author_id):
+    """Сбрасывает список знаменитостей, если автор пересёк порог.
+    Посты, написанные в статусе знаменитости, не рассылались, поэтому
+    при переходе вниз они переносятся в ленты оставшихся подписчиков."""
+    over_threshold = (
+        counters.follower_count(author_id)
+        >= settings.FEED_CELEBRITY_FOLLOWERS
+    )
+    was_celebrity = is_celebrity(author_id)
+    if over_threshold != was_celebrity:
+        reset_celebrities()
+        if was_celebrity:
+            backfill_followers(author_id)
+
+
+def _insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _insert(
+        FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Переносит в ленту подписчика последние посты автора."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')
+    _insert(
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts[:settings.FEED_BACKFILL_SIZE]
+    )
+
+
+def backfill_followers(author_id):
+    """Переносит последние посты автора в ленты всех его подписчиков."""
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list(
+        'id', 'pub_date')[:settings.FEED_BACKFILL_SIZE])
+    if not posts:
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    _insert(
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in followers.iterator()
+        for post_id, pub_date in posts
+    )
+
+
+def rebuild(depth=None):
+    """Заново заполняет все ленты набором запросов вместо сигналов,
+    например после bulk_create: как backfill для каждой подписки,
+    по depth (FEED_BACKFILL_SIZE) последних постов автора,
+    кроме знаменитостей."""
+    reset_celebrities()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FeedEntry._meta.db_table}')
+        _insert_select(*_backfill_select('', [], depth))
+
+
+def backfill_follows(follow_ids, depth=None):
+    """backfill для каждой подписки follow_ids набором запросов,
+    например после их загрузки bulk_create."""
+    for batch in _batches(follow_ids):
+        _insert_select(*_backfill_select(
+            f'AND follow.id IN ({_placeholders(batch)})', batch, depth))
+
+
+def fan_out_posts(post_ids):
+    """fan_out для каждого поста post_ids набором запросов."""
+    post_table = Post._meta.db_table
+    excluded = _excluded_authors()
+    for batch in _batches(post_ids):
+        _insert_select(
+            f'''
+            SELECT follow.user_id, post.id, post.pub_date
+            FROM {Follow._meta.db_table} follow
+            JOIN {post_table} post ON post.author_id = follow.author_id
+            WHERE post.id IN ({_placeholders(batch)})
+              AND post.author_id NOT IN ({_placeholders(excluded)})
+            ''',
+            [*batch, *excluded],
+        )
+
+
+def _backfill_select(condition, params, depth=None):
+    """Запрос строк лент: depth последних постов автора для каждой
+    подписки, подходящей под condition, кроме знаменитостей."""
+    if depth is None:
+        depth = settings.FEED_BACKFILL_SIZE
+    excluded = _excluded_authors()
+    post_table = Post._meta.db_table
+    return (
+        f'''
+        SELECT follow.user_id, post.id, post.pub_date
+        FROM {Follow._meta.db_table} follow
+        JOIN {post_table} post ON post.id IN (
+            SELECT latest.id FROM {post_table} latest
+            WHERE latest.author_id = follow.author_id
+            ORDER BY latest.pub_date DESC, latest.id DESC
+            LIMIT %s
+        )
+        WHERE follow.author_id NOT IN ({_placeholders(excluded)})
+        {condition}
+        ''',
+        [depth, *excluded, *params],
+    )
+
+
+def _insert_select(select, params):
+    """Добавляет в ленты строки (user_id, post_id, pub_date) запроса
+    select, пропуская уже существующие."""
+    insert = connection.ops.insert_statement(ignore_conflicts=True)
+    suffix = connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{insert} {FeedEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) {select} {suffix}',
+            params,
+        )
+
+
+def _excluded_authors():
+    return sorted(celebrities()) or [0]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _batches(ids):
+    ids = iter(ids)
+    while True:
+        batch = list(islice(ids, FEED_IDS_BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты бывшего подписчика."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def feed_for(user):
+    """Лента подписок пользователя: чтение одного диапазона индекса."""
+    return FeedEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group')
+
+
+def feed_sources(user):
+    """Источники ленты: материализованная лента и посты знаменитостей,
+    на которых подписан пользователь, — одним источником, сколько бы
+    знаменитостей ни было."""
+    sources = [(feed_for(user), FEED_ORDERING)]
+    pulled = celebrities()
+    if pulled:
+        authors = list(Follow.objects.filter(
+            user=user, author_id__in=pulled).values_list(
+            'author_id', flat=True))
+        if authors:
+            sources.append((
+                Post.objects.for_listing().filter(author_id__in=authors),
+                CURSOR_ORDERING,
+            ))
+    return sources
+
+
+def as_posts(items):
+    return [
+        item.post if isinstance(item, FeedEntry) else item
+        for item in items
+    ]
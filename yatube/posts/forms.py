@@ -1,12 +1,64 @@
 from django import forms
 
-from .models import Post, Comment, Group
+from . import images
+from .groups import default_group, groups
+from .models import Post, Comment
+
+
+class PostImageField(forms.ImageField):
+    """Картинка поста: отклоняется по размеру файла и разрешению
+    из заголовка, сохраняется уменьшенной и перекодированной."""
+
+    def to_python(self, data):
+        file = forms.FileField.to_python(self, data)
+        if file is None:
+            return None
+        return images.ingest(file)
+
+
+class GroupChoiceIterator:
+    def __init__(self, field):
+        self.field = field
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for pk, group in groups().items():
+            yield (pk, self.field.label_from_instance(group))
+
+    def __len__(self):
+        return len(groups()) + (self.field.empty_label is not None)
+
+
+class GroupChoiceField(forms.ModelChoiceField):
+    """Выбор группы из списка в памяти процесса (posts.groups):
+    ни вывод, ни проверка значения не обращаются к базе."""
+
+    def _get_choices(self):
+        return GroupChoiceIterator(self)
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return groups()[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+            )
 
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image',)
+        field_classes = {
+            'group': GroupChoiceField,
+            'image': PostImageField,
+        }
         labels = {
             'text': 'Текст поста',
             'group': 'Группа',
@@ -22,10 +74,7 @@ class PostForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        try:
-            self.fields['group'].initial = Group.objects.get(id=4)
-        except Group.DoesNotExist:
-            self.fields['group'].initial = None
+        self.fields['group'].initial = default_group()
 
 
 class CommentForm(forms.ModelForm):
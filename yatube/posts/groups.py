@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import transaction
+
+from . import versions
+from .models import Group
+
+GROUPS = 'groups'
+
+# (версия, {id: группа}, {slug: группа}) — копия списка групп в памяти
+# процесса. Группы меняются редко, поэтому форма поста строится и
+# проверяется без запросов к базе.
+_cache = (None, {}, {})
+
+
+def _load():
+    global _cache
+    current = versions.version(GROUPS)
+    cached_version, by_id, by_slug = _cache
+    if cached_version != current:
+        by_id = {group.pk: group for group in Group.objects.order_by('pk')}
+        by_slug = {group.slug: group for group in by_id.values()}
+        _cache = (current, by_id, by_slug)
+    return by_id, by_slug
+
+
+def groups():
+    """{id: группа}. Версия списка хранится в общем кэше, поэтому
+    изменение группы в одном процессе видят и остальные."""
+    return _load()[0]
+
+
+def default_group():
+    """Группа по умолчанию для нового поста (POST_DEFAULT_GROUP)."""
+    return _load()[1].get(settings.POST_DEFAULT_GROUP)
+
+
+def expire():
+    # Повторно после коммита: иначе другой процесс мог успеть
+    # перечитать незакоммиченный список под новой версией.
+    versions.bump(GROUPS)
+    transaction.on_commit(lambda: versions.bump(GROUPS))
@@ -0,0 +1,84 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+
+def too_large_error():
+    return ValidationError(
+        'Файл больше %(limit)s.',
+        code='file_too_large',
+        params={'limit': filesizeformat(settings.FILE_UPLOAD_MAX_SIZE)},
+    )
+
+
+def open_image(file):
+    """Открывает картинку, читая только заголовок: пиксели
+    декодируются позже, уже после проверки размеров."""
+    if file.size > settings.FILE_UPLOAD_MAX_SIZE:
+        raise too_large_error()
+    file.seek(0)
+    try:
+        image = Image.open(file)
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Слишком большое разрешение картинки.', code='too_many_pixels')
+    except Exception:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image')
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое разрешение картинки: %(width)s×%(height)s.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+    return image
+
+
+def normalize(image):
+    """Поворачивает картинку по EXIF и уменьшает до
+    POST_IMAGE_MAX_SIZE по большей стороне."""
+    max_size = (settings.POST_IMAGE_MAX_SIZE, settings.POST_IMAGE_MAX_SIZE)
+    # JPEG декодируется сразу в уменьшенном масштабе
+    image.draft('RGB', max_size)
+    image = ImageOps.exif_transpose(image)
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    image = image.convert(
+        'RGBA' if has_alpha and settings.POST_IMAGE_FORMAT != 'JPEG'
+        else 'RGB'
+    )
+    image.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return image
+
+
+def encode(image, name):
+    """Перекодирует картинку в POST_IMAGE_FORMAT без метаданных."""
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        settings.POST_IMAGE_FORMAT,
+        quality=settings.POST_IMAGE_QUALITY,
+        optimize=True,
+    )
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return ContentFile(
+        buffer.getvalue(),
+        name=f'{stem}.{settings.POST_IMAGE_FORMAT.lower()}',
+    )
+
+
+def ingest(file):
+    """Проверяет загруженную картинку и возвращает
+    уменьшенную перекодированную копию для сохранения."""
+    image = open_image(file)
+    try:
+        image = normalize(image)
+    except Exception:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image')
+    return encode(image, file.name)
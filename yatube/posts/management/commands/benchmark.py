@@ -0,0 +1,316 @@
+import gc
+import json
+import math
+import os
+import random
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import urls
+from posts.models import Follow, Group, Post
+from posts.seeding import Seeder, zipf_cum_weights
+
+User = get_user_model()
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+BASELINE_DIR = os.path.join(settings.BASE_DIR, 'benchmarks')
+PERCENTILES = (50, 95, 99)
+# Рост p95 меньше этого не считается регрессией: шум таймера
+LATENCY_NOISE_MS = 5.0
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(math.ceil(len(ordered) * percent / 100), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = ('Засевает синтетические данные нужного масштаба, прогоняет '
+            'все адреса posts.urls и сравнивает задержки и число '
+            'запросов с сохранённым эталоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='10k')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Замеров на каждый адрес.')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Прогревочных запросов на каждый адрес.')
+        parser.add_argument('--baseline',
+                            help='Файл эталона, по умолчанию '
+                                 'benchmarks/<scale>.json.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Сохранить результат как эталон.')
+        parser.add_argument('--latency-tolerance', type=float, default=1.0,
+                            help='Допустимый рост p95, доля от эталона.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.ensure_dataset(SCALES[options['scale']], options['seed'])
+        self.load_targets()
+        with transaction.atomic():
+            cache.clear()
+            results = {
+                name: self.measure(name, options)
+                for name in self.route_names()
+            }
+            transaction.set_rollback(True)
+        cache.clear()
+        self.report(results)
+        path = options['baseline'] or os.path.join(
+            BASELINE_DIR, f'{options["scale"]}.json')
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Эталон сохранён: {path}'))
+        elif os.path.exists(path):
+            self.compare(results, path, options['latency_tolerance'])
+        else:
+            self.stdout.write(self.style.WARNING(f'Нет эталона {path}'))
+
+    def ensure_dataset(self, target, seed):
+        missing = target - Post.objects.count()
+        if missing <= 0:
+            return
+        self.stdout.write(
+            f'Досоздаём {missing} постов в {connection.settings_dict["NAME"]}')
+        started = perf_counter()
+        Seeder(missing, seed=seed, log=self.stdout.write).run()
+        self.stdout.write(f'Готово за {perf_counter() - started:.0f} с')
+
+    def load_targets(self):
+        """Кандидаты для запросов; популярные авторы, группы
+        и свежие посты выбираются чаще. Порядок кандидатов задан явно,
+        а выбор идёт через self.rng: с тем же --seed на тех же данных
+        запросы те же, и число запросов к базе воспроизводится."""
+        self.authors = list(Post.objects.order_by('author_id').values_list(
+            'author_id', flat=True).distinct())
+        self.author_weights = zipf_cum_weights(len(self.authors), 1.1)
+        self.groups = list(Group.objects.order_by('slug').values_list(
+            'slug', flat=True))
+        self.group_weights = zipf_cum_weights(len(self.groups), 1.0)
+        self.posts = list(Post.objects.order_by(
+            '-pub_date', '-id').values_list('id', 'author_id')[:100_000])
+        self.post_weights = zipf_cum_weights(len(self.posts), 0.8)
+        self.follows = list(Follow.objects.order_by(
+            'pk').values_list('user_id', 'author_id')[:10_000])
+        self.rng.shuffle(self.follows)
+        self.words = Post.objects.order_by(
+            '-pub_date', '-id').values_list(
+            'text', flat=True).first().split()
+        self.clients = {}
+
+    def pick(self, items, weights):
+        return self.rng.choices(items, cum_weights=weights)[0]
+
+    def client(self, user_id=None):
+        if user_id not in self.clients:
+            client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            if user_id is not None:
+                client.force_login(User.objects.get(pk=user_id))
+            self.clients[user_id] = client
+        return self.clients[user_id]
+
+    def route_names(self):
+        names = [pattern.name for pattern in urls.urlpatterns]
+        missing = [name for name in names if not hasattr(self, f'_{name}')]
+        if missing:
+            raise CommandError(
+                f'Нет сценария для адресов posts: {", ".join(missing)}')
+        return names
+
+    # Сценарии: (клиент, метод, адрес, данные) для каждого адреса posts.
+
+    def _index(self):
+        page = self.rng.choices((1, 1, 1, 2, 3, 10))[0]
+        return self.client(), 'get', reverse('posts:index'), {'page': page}
+
+    def _index_fragment(self):
+        return self.client(), 'get', reverse('posts:index_fragment'), {}
+
+    def _group_list_fragment(self):
+        slug = self.pick(self.groups, self.group_weights)
+        return self.client(), 'get', reverse('posts:group_list_fragment',
+                                             args=(slug,)), {}
+
+    def _profile_fragment(self):
+        author = User.objects.get(
+            pk=self.pick(self.authors, self.author_weights))
+        return self.client(), 'get', reverse('posts:profile_fragment',
+                                             args=(author.username,)), {}
+
+    def _group_list(self):
+        slug = self.pick(self.groups, self.group_weights)
+        return self.client(), 'get', reverse('posts:group_list',
+                                             args=(slug,)), {}
+
+    def _profile(self):
+        author = User.objects.get(
+            pk=self.pick(self.authors, self.author_weights))
+        return self.client(), 'get', reverse('posts:profile',
+                                             args=(author.username,)), {}
+
+    def _post_detail(self):
+        post_id, _ = self.pick(self.posts, self.post_weights)
+        return self.client(), 'get', reverse('posts:post_detail',
+                                             args=(post_id,)), {}
+
+    def _post_comments(self):
+        post_id, _ = self.pick(self.posts, self.post_weights)
+        return self.client(), 'get', reverse('posts:post_comments',
+                                             args=(post_id,)), {}
+
+    def _search(self):
+        return self.client(), 'get', reverse('posts:search'), {
+            'q': self.rng.choice(self.words)}
+
+    def _search_api(self):
+        return self.client(), 'get', reverse('posts:search_api'), {
+            'q': self.rng.choice(self.words)}
+
+    def _export(self):
+        staff, _ = User.objects.get_or_create(
+            username='benchmark-staff', defaults={'is_staff': True})
+        return self.client(staff.pk), 'get', reverse('posts:export'), {
+            'models': 'group,follow'}
+
+    def _post_create(self):
+        author = self.pick(self.authors, self.author_weights)
+        return self.client(author), 'post', reverse('posts:post_create'), {
+            'text': ' '.join(self.rng.choices(self.words, k=20))}
+
+    def _post_edit(self):
+        post_id, author = self.pick(self.posts, self.post_weights)
+        return self.client(author), 'post', reverse(
+            'posts:post_edit', args=(post_id,)), {
+            'text': ' '.join(self.rng.choices(self.words, k=20))}
+
+    def _add_comment(self):
+        post_id, _ = self.pick(self.posts, self.post_weights)
+        user = self.pick(self.authors, self.author_weights)
+        return self.client(user), 'post', reverse(
+            'posts:add_comment', args=(post_id,)), {
+            'text': ' '.join(self.rng.choices(self.words, k=10))}
+
+    def _follow_index(self):
+        user, _ = self.rng.choice(self.follows)
+        return self.client(user), 'get', reverse('posts:follow_index'), {}
+
+    def _api_index(self):
+        return self.client(), 'get', reverse('posts:api_index'), {}
+
+    def _api_post_detail(self):
+        post_id, _ = self.pick(self.posts, self.post_weights)
+        return self.client(), 'get', reverse('posts:api_post_detail',
+                                             args=(post_id,)), {}
+
+    def _api_group_posts(self):
+        slug = self.pick(self.groups, self.group_weights)
+        return self.client(), 'get', reverse('posts:api_group_posts',
+                                             args=(slug,)), {}
+
+    def _api_profile(self):
+        author = User.objects.get(
+            pk=self.pick(self.authors, self.author_weights))
+        return self.client(), 'get', reverse('posts:api_profile',
+                                             args=(author.username,)), {}
+
+    def _api_follow_index(self):
+        user, _ = self.rng.choice(self.follows)
+        return self.client(user), 'get', reverse(
+            'posts:api_follow_index'), {}
+
+    def _profile_follow(self):
+        user = self.rng.choice(self.authors)
+        author = User.objects.get(
+            pk=self.pick(self.authors, self.author_weights))
+        return self.client(user), 'get', reverse(
+            'posts:profile_follow', args=(author.username,)), {}
+
+    def _profile_unfollow(self):
+        user, author = self.follows.pop()
+        author = User.objects.get(pk=author)
+        return self.client(user), 'get', reverse(
+            'posts:profile_unfollow', args=(author.username,)), {}
+
+    def measure(self, name, options):
+        scenario = getattr(self, f'_{name}')
+        gc.collect()
+        timings = []
+        queries = []
+        for number in range(options['warmup'] + options['requests']):
+            client, method, url, data = scenario()
+            # Журнал запросов ограничен 9000 записями
+            reset_queries()
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                response = getattr(client, method)(url, data)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = (perf_counter() - started) * 1000
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{method.upper()} {url}: {response.status_code}')
+            if number >= options['warmup']:
+                timings.append(elapsed)
+                queries.append(len(context))
+        result = {
+            f'p{percent}': round(percentile(timings, percent), 2)
+            for percent in PERCENTILES
+        }
+        result['queries'] = max(queries)
+        return result
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"адрес":<18} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"p99, мс":>9} {"запросов":>9}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<18} {result["p50"]:>9.2f} {result["p95"]:>9.2f} '
+                f'{result["p99"]:>9.2f} {result["queries"]:>9}'
+            )
+
+    def compare(self, results, path, tolerance):
+        """Регрессия — больше запросов, чем в эталоне,
+        или p95 выше эталона больше чем на tolerance. Адрес без записи
+        в эталоне тоже ошибка: эталон нужно пересохранить."""
+        with open(path) as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                regressions.append(
+                    f'{name}: нет в эталоне, сохраните его заново '
+                    f'с --save-baseline')
+                continue
+            if result['queries'] > expected['queries']:
+                regressions.append(
+                    f'{name}: запросов {result["queries"]} '
+                    f'вместо {expected["queries"]}')
+            limit = expected['p95'] * (1 + tolerance)
+            if (
+                result['p95'] > limit
+                and result['p95'] - expected['p95'] > LATENCY_NOISE_MS
+            ):
+                regressions.append(
+                    f'{name}: p95 {result["p95"]:.2f} мс '
+                    f'вместо {expected["p95"]:.2f} мс')
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(regression))
+            raise CommandError(
+                f'Регрессий по сравнению с {path}: {len(regressions)}')
+        self.stdout.write(self.style.SUCCESS(f'Не хуже эталона {path}'))
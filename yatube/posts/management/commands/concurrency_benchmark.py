@@ -0,0 +1,176 @@
+import random
+import threading
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.test import Client
+from django.urls import reverse
+
+from posts.management.commands.benchmark import percentile
+from posts.models import Post
+
+User = get_user_model()
+PREFIX = 'concurrency-bench'
+# Настройки базы до появления core.db_backends.sqlite3: журнал DELETE,
+# synchronous=full, транзакции DEFERRED и новое соединение на каждый
+# запрос. Прагмы заданы явно: режим WAL сохраняется в файле базы.
+PROFILES = {
+    'plain': {
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'delete',
+                'synchronous': 'full',
+                'busy_timeout': 5000,
+                'cache_size': -2000,
+                'mmap_size': 0,
+            },
+            'transaction_mode': 'DEFERRED',
+        },
+    },
+    'tuned': {
+        'CONN_MAX_AGE': settings.CONN_MAX_AGE,
+        'OPTIONS': settings.SQLITE_OPTIONS,
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Нагружает базу параллельными писателями (новые посты и '
+            'комментарии) и читателями (лента, пост, профиль) и сравнивает '
+            'пропускную способность со старыми и текущими настройками SQLite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Секунд на каждый профиль.')
+        parser.add_argument('--profiles', default=','.join(PROFILES),
+                            help='Профили настроек через запятую.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('Бенчмарк рассчитан на SQLite')
+        profiles = [name for name in options['profiles'].split(',') if name]
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные профили: {", ".join(sorted(unknown))}')
+        self.posts = list(Post.objects.order_by(
+            '-pub_date').values_list('id', 'author__username')[:1000])
+        if not self.posts:
+            raise CommandError('Нет постов: сначала выполните seed')
+        self.users = [
+            User.objects.get_or_create(username=f'{PREFIX}-{number}')[0]
+            for number in range(options['writers'])
+        ]
+        self.stdout.write(
+            f'{"профиль":<8} {"записей/с":>10} {"чтений/с":>10} '
+            f'{"p95 записи, мс":>15} {"p95 чтения, мс":>15} '
+            f'{"ошибок":>7}'
+        )
+        try:
+            for name in profiles:
+                row = self.run(PROFILES[name], options)
+                self.stdout.write(
+                    f'{name:<8} {row["writes"]:>10.1f} {row["reads"]:>10.1f} '
+                    f'{row["write_p95"]:>15.1f} {row["read_p95"]:>15.1f} '
+                    f'{row["errors"]:>7}'
+                )
+        finally:
+            # Посты и комментарии удаляются вместе с авторами
+            User.objects.filter(username__startswith=f'{PREFIX}-').delete()
+
+    def run(self, profile, options):
+        """Прогон с настройками profile. Соединения потоков создаются
+        заново и читают общий settings_dict основной базы."""
+        settings_dict = connections.databases[DEFAULT_DB_ALIAS]
+        saved = {key: settings_dict[key] for key in profile}
+        settings_dict.update(profile)
+        connections[DEFAULT_DB_ALIAS].close()
+        try:
+            return self.measure(options)
+        finally:
+            settings_dict.update(saved)
+            connections[DEFAULT_DB_ALIAS].close()
+
+    def measure(self, options):
+        results = {'write': [], 'read': [], 'errors': 0}
+        lock = threading.Lock()
+        deadline = []
+        barrier = threading.Barrier(
+            options['writers'] + options['readers'],
+            action=lambda: deadline.append(
+                perf_counter() + options['duration']),
+        )
+
+        def worker(number, client, scenario, user=None):
+            rng = random.Random(options['seed'] + number)
+            timings, errors = [], 0
+            barrier.wait()
+            try:
+                while perf_counter() < deadline[0]:
+                    method, url, data = scenario(rng, user)
+                    started = perf_counter()
+                    try:
+                        getattr(client, method)(url, data)
+                    except OperationalError:
+                        errors += 1
+                    else:
+                        timings.append((perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            with lock:
+                results['write' if user else 'read'].extend(timings)
+                results['errors'] += errors
+
+        # Клиенты входят заранее: ошибка до барьера оставила бы
+        # остальные потоки ждать вечно
+        threads = [
+            threading.Thread(target=worker, args=(
+                number, self.client(user), self.write, user))
+            for number, user in enumerate(self.users)
+        ] + [
+            threading.Thread(target=worker, args=(
+                len(self.users) + number, self.client(), self.read))
+            for number in range(options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'writes': len(results['write']) / options['duration'],
+            'reads': len(results['read']) / options['duration'],
+            'write_p95': percentile(results['write'] or [0], 95),
+            'read_p95': percentile(results['read'] or [0], 95),
+            'errors': results['errors'],
+        }
+
+    def client(self, user=None):
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        if user is not None:
+            client.force_login(user)
+        return client
+
+    # Сценарии: (метод клиента, адрес, данные).
+
+    def write(self, rng, user):
+        if rng.random() < 0.3:
+            return 'post', reverse('posts:post_create'), {
+                'text': f'Пост {PREFIX} {rng.random()}'}
+        post_id, _ = rng.choice(self.posts)
+        return 'post', reverse('posts:add_comment', args=(post_id,)), {
+            'text': f'Комментарий {PREFIX}'}
+
+    def read(self, rng, user):
+        post_id, username = rng.choice(self.posts)
+        return rng.choice((
+            ('get', reverse('posts:index'), {}),
+            ('get', reverse('posts:post_detail', args=(post_id,)), {}),
+            ('get', reverse('posts:profile', args=(username,)), {}),
+        ))
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import (
+    EXPORT_CHUNK_SIZE, MODELS, TransferError, export, model_names
+)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в NDJSON, '
+            'читая базу порциями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models', default='',
+            help=f'Через запятую из {", ".join(MODELS)}; по умолчанию все.',
+        )
+        parser.add_argument('--output', '-o',
+                            help='Файл; по умолчанию stdout.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            names = model_names(options['models'])
+        except TransferError as error:
+            raise CommandError(error)
+        lines = export(names, options['chunk_size'])
+        if not options['output']:
+            sys.stdout.writelines(lines)
+            return
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            file.writelines(lines)
@@ -0,0 +1,136 @@
+import random
+from statistics import mean
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from posts import feed
+from posts.models import FeedEntry, Follow, Post
+from posts.views import follow_index
+
+User = get_user_model()
+SCENARIOS = ('uniform', 'zipf', 'celebrity')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает рассылку при записи, чтение при просмотре '
+            'и гибридную ленту подписок на разных графах подписок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--readers', type=int, default=500)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок у каждого читателя.')
+        parser.add_argument('--posts', type=int, default=20,
+                            help='Постов у каждого автора.')
+        parser.add_argument('--threshold', type=int, default=100,
+                            help='Порог подписчиков для гибридной ленты.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        modes = {
+            'push': options['readers'] + 1,
+            'pull': 1,
+            'hybrid': options['threshold'],
+        }
+        self.stdout.write(
+            f'{"сценарий":<10} {"режим":<7} {"макс. подп.":>11} '
+            f'{"запись, мс":>11} {"строк ленты":>12} '
+            f'{"чтение, мс":>11} {"запросов":>9}'
+        )
+        for scenario in SCENARIOS:
+            for mode, threshold in modes.items():
+                with override_settings(FEED_CELEBRITY_FOLLOWERS=threshold):
+                    row = self.run(scenario, options)
+                self.stdout.write(
+                    f'{scenario:<10} {mode:<7} {row["max_followers"]:>11} '
+                    f'{row["write_ms"]:>11.1f} {row["feed_rows"]:>12} '
+                    f'{row["read_ms"]:>11.2f} {row["queries"]:>9}'
+                )
+
+    def run(self, scenario, options):
+        with transaction.atomic():
+            feed.reset_celebrities()
+            authors, readers = self.build_graph(scenario, options)
+            result = self.measure(authors, readers)
+            transaction.set_rollback(True)
+        feed.reset_celebrities()
+        return result
+
+    def build_graph(self, scenario, options):
+        rng = random.Random(options['seed'])
+        prefix = f'feed-bench-{scenario}'
+        User.objects.bulk_create(
+            User(username=f'{prefix}-author-{i}')
+            for i in range(options['authors'])
+        )
+        User.objects.bulk_create(
+            User(username=f'{prefix}-reader-{i}')
+            for i in range(options['readers'])
+        )
+        authors = list(User.objects.filter(
+            username__startswith=f'{prefix}-author-').order_by('id'))
+        readers = list(User.objects.filter(
+            username__startswith=f'{prefix}-reader-').order_by('id'))
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}')
+            for author in authors
+            for i in range(options['posts'])
+        )
+        weights = [1 / (rank + 1) ** 1.1 for rank in range(len(authors))]
+        follows = []
+        for reader in readers:
+            if scenario == 'zipf':
+                chosen = set()
+                while len(chosen) < options['follows']:
+                    chosen.update(rng.choices(
+                        range(len(authors)), weights,
+                        k=options['follows'] - len(chosen)))
+            else:
+                chosen = set(rng.sample(
+                    range(len(authors)), options['follows']))
+                if scenario == 'celebrity':
+                    chosen.add(0)
+            follows.extend(
+                Follow(user=reader, author=authors[i]) for i in chosen)
+        Follow.objects.bulk_create(follows)
+        for follow in follows:
+            feed.backfill(follow.user_id, follow.author_id)
+        return authors, readers
+
+    def measure(self, authors, readers):
+        followers = sorted(
+            authors,
+            key=lambda author: -Follow.objects.filter(author=author).count(),
+        )
+        rows_before = FeedEntry.objects.count()
+        started = perf_counter()
+        for author in followers[:10]:
+            Post.objects.create(author=author, text='Новый пост')
+        write_ms = (perf_counter() - started) * 1000
+        feed_rows = FeedEntry.objects.count() - rows_before
+
+        factory = RequestFactory()
+        timings = []
+        queries = []
+        for reader in readers[:50]:
+            request = factory.get('/follow/')
+            request.user = reader
+            reset_queries()
+            with CaptureQueriesContext(connection) as context:
+                started = perf_counter()
+                follow_index(request)
+                timings.append((perf_counter() - started) * 1000)
+            queries.append(len(context))
+        return {
+            'max_followers': Follow.objects.filter(
+                author=followers[0]).count(),
+            'write_ms': write_ms,
+            'feed_rows': feed_rows,
+            'read_ms': mean(timings),
+            'queries': max(queries),
+        }
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.pagination import CURSOR_ORDERING, keyset_condition
+from posts.feed import feed_for
+from posts.models import Comment, FeedEntry, Follow, Post
+from posts.seeding import Seeder
+
+FEED_INDEXES = (Post, Comment, FeedEntry)
+
+
+class Command(BaseCommand):
+    help = ('Показывает планы запросов лент posts.views '
+            'с индексами и без них.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=0,
+            help='Досоздать посты, пока их не станет столько.')
+
+    def handle(self, *args, **options):
+        if options['posts']:
+            self.seed(options['posts'])
+        queries = self.feed_queries()
+        self.stdout.write(self.style.MIGRATE_HEADING('С индексами'))
+        self.explain(queries)
+        # Новое соединение: SQLite кэширует подготовленные EXPLAIN.
+        connection.close()
+        with transaction.atomic():
+            self.drop_indexes()
+            self.stdout.write(self.style.MIGRATE_HEADING('Без индексов'))
+            self.explain(queries)
+            transaction.set_rollback(True)
+
+    def seed(self, total):
+        missing = total - Post.objects.count()
+        if missing > 0:
+            Seeder(missing, log=self.stdout.write).run()
+
+    def feed_queries(self):
+        per_page = settings.POSTS_PER_PAGE
+        post = Post.objects.order_by('-pub_date').first()
+        follow = Follow.objects.first()
+        if post is None:
+            return {}
+        return {
+            'index': Post.objects.for_listing()[:per_page],
+            'index (keyset)': Post.objects.for_listing().order_by(
+                *CURSOR_ORDERING).filter(keyset_condition(
+                    CURSOR_ORDERING, (post.pub_date, post.id)))[:per_page],
+            'group_posts': Post.objects.for_listing().filter(
+                group_id=post.group_id)[:per_page],
+            'profile': Post.objects.for_listing().filter(
+                author_id=post.author_id)[:per_page],
+            'follow_index': feed_for(
+                getattr(follow, 'user_id', post.author_id))[:per_page],
+            'post_detail comments': Comment.objects.filter(
+                post_id=post.id).order_by('pub_date', 'id'),
+            'profile following': Follow.objects.filter(
+                user_id=post.author_id, author_id=post.author_id),
+        }
+
+    def explain(self, queries):
+        for name, queryset in queries.items():
+            self.stdout.write(self.style.SQL_TABLE(name))
+            self.stdout.write(queryset.explain())
+
+    def drop_indexes(self):
+        schema_editor = connection.schema_editor(atomic=False)
+        with connection.cursor() as cursor:
+            for model in FEED_INDEXES:
+                for index in model._meta.indexes:
+                    cursor.execute(
+                        str(index.remove_sql(model, schema_editor)))
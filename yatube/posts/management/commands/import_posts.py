@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import IMPORT_BATCH_SIZE, TransferError, load
+
+
+class Command(BaseCommand):
+    help = ('Загружает NDJSON из export_posts пачками bulk_create. '
+            'Объекты с занятым pk или slug пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON или - для stdin.')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            stats = self.load(sys.stdin, options['batch_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                stats = self.load(file, options['batch_size'])
+        for (name, outcome), number in sorted(stats.items()):
+            self.stdout.write(f'{name} {outcome}: {number}')
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена.'))
+
+    def load(self, lines, batch_size):
+        try:
+            return load(lines, batch_size)
+        except (TransferError, ValueError, KeyError) as error:
+            raise CommandError(f'Некорректные данные: {error!r}')
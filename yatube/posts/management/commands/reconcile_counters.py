@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики с данными и исправляет '
+            'расхождения, например после bulk_create или ручных правок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile(dry_run=options['dry_run'])
+        for family, drifted in fixed.items():
+            self.stdout.write(f'{family}: {drifted}')
+        total = sum(fixed.values())
+        if options['dry_run']:
+            self.stdout.write(f'Расходится счётчиков: {total}')
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Исправлено счётчиков: {total}'))
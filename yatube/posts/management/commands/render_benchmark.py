@@ -0,0 +1,191 @@
+import gc
+from datetime import timedelta
+from itertools import count
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.utils import timezone
+
+from core.pagination import CursorPage, CursorPaginator
+from posts.forms import CommentForm
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+TEMPLATES = ('index', 'profile', 'post_detail')
+SOURCE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+CACHED_LOADERS = [('django.template.loaders.cached.Loader', SOURCE_LOADERS)]
+CARD_INCLUDE = "{% include 'posts/includes/post_card.html' %}"
+# Вариант: (загрузчики, карточка поста встроена в страницу).
+# plain — загрузчики при TEMPLATE_CACHE=0, cached — при TEMPLATE_CACHE=1,
+# как по умолчанию; inline против cached показывает цену {% include %}
+# на пост.
+VARIANTS = {
+    'plain': (SOURCE_LOADERS, False),
+    'cached': (CACHED_LOADERS, False),
+    'inline': (CACHED_LOADERS, True),
+}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет отрисовку index.html, profile.html и post_detail.html '
+            'на объектах в памяти, без базы, с кэшируемыми загрузчиками '
+            'шаблонов и без них, а также с карточкой поста, встроенной '
+            'в страницу вместо {% include %}. Стоимость одного поста '
+            '(комментария для post_detail) — разница между размерами '
+            'страниц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100',
+                            help='Постов на странице через запятую.')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Отрисовок на каждый замер.')
+        parser.add_argument('--variants', default=','.join(VARIANTS),
+                            help='Варианты через запятую.')
+
+    def handle(self, *args, **options):
+        sizes = sorted({int(size) for size in options['sizes'].split(',')})
+        variants = [name for name in options['variants'].split(',') if name]
+        unknown = set(variants) - set(VARIANTS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные варианты: {", ".join(sorted(unknown))}')
+        self.versions = count()
+        self.build_objects(max(sizes))
+        self.stdout.write(
+            f'{"шаблон":<12} {"вариант":<9} {"постов":>7} '
+            f'{"мс":>8} {"мкс на пост":>12}'
+        )
+        try:
+            for name in TEMPLATES:
+                for variant in variants:
+                    load = self.template_loader(variant, name)
+                    if load is None:
+                        continue
+                    timings = {
+                        size: self.measure(
+                            load, name, size, options['repeat'])
+                        for size in sizes
+                    }
+                    for size, ms in timings.items():
+                        per_item = ''
+                        if size != sizes[0]:
+                            per_item = (
+                                (ms - timings[sizes[0]]) * 1000
+                                / (size - sizes[0])
+                            )
+                            per_item = f'{per_item:.1f}'
+                        self.stdout.write(
+                            f'{name:<12} {variant:<9} {size:>7} '
+                            f'{ms:>8.2f} {per_item:>12}'
+                        )
+        finally:
+            cache.clear()
+
+    def template_loader(self, variant, name):
+        """Функция, возвращающая шаблон страницы name в варианте
+        variant, или None, если страница не включает карточку поста.
+        Страница со встроенной карточкой компилируется один раз,
+        как её компилировал бы cached.Loader."""
+        loaders, inline = VARIANTS[variant]
+        config = settings.TEMPLATES[0]
+        backend = DjangoTemplates({
+            'NAME': f'render-benchmark-{variant}',
+            'DIRS': config['DIRS'],
+            'APP_DIRS': False,
+            'OPTIONS': {**config['OPTIONS'], 'loaders': loaders},
+        })
+        path = f'posts/{name}.html'
+        if not inline:
+            return lambda: backend.get_template(path)
+        source = backend.get_template(path).template.source
+        if CARD_INCLUDE not in source:
+            return None
+        card = backend.get_template('posts/includes/post_card.html')
+        template = backend.from_string(
+            source.replace(CARD_INCLUDE, card.template.source))
+        return lambda: template
+
+    def build_objects(self, size):
+        """Несохранённые объекты: замеряются только шаблоны."""
+        self.author = User(
+            pk=1, username='leo', first_name='Лев', last_name='Толстой')
+        group = Group(pk=1, title='Группа', slug='group')
+        now = timezone.now()
+        # Вдвое больше постов, чем на странице: есть следующая страница
+        self.posts = [
+            Post(
+                pk=number, text=f'Текст поста {number} ' * 20,
+                author=self.author, group=group if number % 2 else None,
+                pub_date=now - timedelta(minutes=number),
+            )
+            for number in range(1, size * 2 + 1)
+        ]
+        self.comments = [
+            Comment(
+                pk=number, post=self.posts[0], author=self.author,
+                text=f'Комментарий {number}',
+            )
+            for number in range(1, size * 2 + 1)
+        ]
+
+    def page(self, objects, size):
+        """Страница курсорной пагинации, за ней есть ещё. Пустой
+        queryset paginator нужен только навигации и не выполняется."""
+        return CursorPage(
+            objects[:size], CursorPaginator(Post.objects.none(), size),
+            'cursor', None)
+
+    def context(self, name, size):
+        page_obj = self.page(self.posts, size)
+        context = {
+            'page_obj': page_obj,
+            'comment_counts': {post.pk: 3 for post in page_obj},
+            'page_url': '/',
+            'fragment_url': '/fragments/posts/',
+            # Новая версия на каждую отрисовку: фрагмент списка
+            # не берётся из кэша
+            'posts_version': next(self.versions),
+            'posts_cache_timeout': 60,
+        }
+        if name == 'profile':
+            context.update({
+                'author': self.author,
+                'posts_count': len(self.posts),
+                'followers_count': 10,
+                'following_count': 5,
+                'following': False,
+            })
+        elif name == 'post_detail':
+            comments = self.page(self.comments, size)
+            context = {
+                'post': self.posts[0],
+                'count_post': len(self.posts),
+                'form': CommentForm(),
+                'comments': comments,
+            }
+        return context
+
+    def measure(self, load, name, size, repeat):
+        """Медиана отрисовки в мс, вместе с загрузкой шаблона.
+        Первая отрисовка прогревает загрузчик и не учитывается."""
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        load().render(self.context(name, size), request)
+        gc.collect()
+        timings = []
+        for _ in range(repeat):
+            context = self.context(name, size)
+            started = perf_counter()
+            load().render(context, request)
+            timings.append((perf_counter() - started) * 1000)
+        return median(timings)
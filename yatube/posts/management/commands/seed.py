@@ -0,0 +1,62 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.seeding import BATCH_SIZE, Seeder
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетических пользователей, группы, посты, '
+            'комментарии и подписки пачками bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--users', type=int,
+                            help='По умолчанию один на 20 постов.')
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок у каждого пользователя.')
+        parser.add_argument('--comments', type=int,
+                            help='По умолчанию половина числа постов.')
+        parser.add_argument('--images', type=int, default=20,
+                            help='Сколько разных картинок у постов.')
+        parser.add_argument('--post-exponent', type=float, default=1.1,
+                            help='Показатель Ципфа для постов по авторам.')
+        parser.add_argument('--follower-exponent', type=float, default=1.1,
+                            help='Показатель Ципфа для подписчиков '
+                                 'по авторам.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты.')
+        parser.add_argument('--feed-depth', type=int, default=20,
+                            help='Постов автора в ленте каждого подписчика.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Строк в одной транзакции.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['posts'] < 1:
+            raise CommandError('--posts должно быть больше нуля.')
+        self.stdout.write(
+            f'База данных: {connection.settings_dict["NAME"]}')
+        self.started = perf_counter()
+        Seeder(
+            options['posts'],
+            users=options['users'],
+            groups=options['groups'],
+            follows=options['follows'],
+            comments=options['comments'],
+            images=options['images'],
+            post_exponent=options['post_exponent'],
+            follower_exponent=options['follower_exponent'],
+            days=options['days'],
+            feed_depth=options['feed_depth'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.log,
+        ).run()
+        self.log('Готово')
+
+    def log(self, message):
+        elapsed = perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:7.1f} с] {message}')
@@ -20,6 +20,13 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    def for_listing(self):
+        """Посты вместе с авторами и группами для вывода в ленте."""
+        return self.select_related('author', 'group')
+
+
 class Post(CreatedModel):
 
     text = models.TextField(
@@ -30,7 +37,8 @@ class Post(CreatedModel):
         User,
         on_delete=models.CASCADE,
         related_name='posts',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False,
     )
     group = models.ForeignKey(
         Group,
@@ -39,7 +47,8 @@ class Post(CreatedModel):
         null=True,
         related_name='posts',
         verbose_name='Группа',
-        help_text='Группа, к которой будет относиться пост'
+        help_text='Группа, к которой будет относиться пост',
+        db_index=False,
     )
     image = models.ImageField(
         'Картинка',
@@ -47,10 +56,22 @@ class Post(CreatedModel):
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = (
+            models.Index(
+                fields=('pub_date', 'id'), name='post_pub_date_idx'),
+            models.Index(
+                fields=('group', 'pub_date', 'id'),
+                name='post_group_pub_date_idx'),
+            models.Index(
+                fields=('author', 'pub_date', 'id'),
+                name='post_author_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -61,6 +82,7 @@ class Comment(CreatedModel):
         Post,
         on_delete=models.CASCADE,
         related_name='comments',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -73,13 +95,21 @@ class Comment(CreatedModel):
         help_text='Введите комментарий'
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'pub_date', 'id'),
+                name='comment_post_pub_date_idx'),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -88,5 +118,48 @@ class Follow(models.Model):
         verbose_name='Пользователь, на которого подписываются'
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'),
+        )
+
     def __str__(self):
         return f'{self.user}'
+
+
+class FeedEntry(models.Model):
+    """Пост в материализованной ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        db_index=False,
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        indexes = (
+            models.Index(
+                fields=('user', 'pub_date', 'post'),
+                name='feed_user_pub_date_idx'),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_feed_entry'),
+        )
+
+
+class Counter(models.Model):
+    """Денормализованный счётчик, чтобы не считать COUNT на каждый запрос."""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}={self.value}'
@@ -0,0 +1,138 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+TERM_RE = re.compile(r'(\w+)(\*?)')
+# Сколько id постов индексируется одним запросом
+INDEX_BATCH_SIZE = 500
+
+
+def parse_query(query):
+    """Слова запроса и признак поиска по префиксу для каждого.
+    Слово со звёздочкой на конце и последнее слово запроса
+    ищутся по префиксу, остальные — целиком."""
+    terms = TERM_RE.findall(query.lower())
+    return [
+        (word, bool(star) or position == len(terms) - 1)
+        for position, (word, star) in enumerate(terms)
+    ]
+
+
+class SearchBackend:
+    """Интерфейс поискового индекса постов."""
+
+    def index(self, post):
+        """Добавляет или обновляет пост в индексе."""
+
+    def index_ids(self, post_ids):
+        """Добавляет в индекс посты с id post_ids."""
+        for post in Post.objects.filter(pk__in=post_ids).iterator():
+            self.index(post)
+
+    def remove(self, post):
+        """Удаляет пост из индекса."""
+
+    def rebuild(self):
+        """Заново строит индекс по всем постам."""
+
+    def search(self, queryset, query):
+        """Посты queryset, подходящие под query, лучшие первыми."""
+        raise NotImplementedError
+
+
+class LikeBackend(SearchBackend):
+    """Поиск без индекса через LIKE, для баз без полнотекстового поиска."""
+
+    def search(self, queryset, query):
+        terms = parse_query(query)
+        if not terms:
+            return queryset.none()
+        condition = Q()
+        for word, _ in terms:
+            condition &= Q(text__icontains=word)
+        return queryset.filter(condition).order_by('-pub_date', '-id')
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Индекс на виртуальной таблице SQLite FTS5, ранжирование по bm25.
+    Таблица создаётся миграцией posts.0011_post_search."""
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text],
+            )
+
+    def index_ids(self, post_ids):
+        post_ids = list(post_ids)
+        for start in range(0, len(post_ids), INDEX_BATCH_SIZE):
+            batch = post_ids[start:start + INDEX_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} '
+                    f'WHERE rowid IN ({placeholders})',
+                    batch,
+                )
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE}(rowid, text) '
+                    f'SELECT id, text FROM {Post._meta.db_table} '
+                    f'WHERE id IN ({placeholders})',
+                    batch,
+                )
+
+    def remove(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+
+    def match(self, query):
+        """Выражение FTS5 MATCH: слова в кавычках, чтобы пользовательский
+        ввод не разбирался как синтаксис запроса."""
+        return ' '.join(
+            f'"{word}"' + ('*' if prefix else '')
+            for word, prefix in parse_query(query)
+        )
+
+    def search(self, queryset, query):
+        match = self.match(query)
+        if not match:
+            return queryset.none()
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = {Post._meta.db_table}.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[match],
+            select={'rank': f'{FTS_TABLE}.rank'},
+        ).order_by('rank', '-pub_date', '-id')
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.POST_SEARCH_BACKEND)()
+
+
+def search_posts(query, queryset=None):
+    if queryset is None:
+        queryset = Post.objects.all()
+    return get_backend().search(queryset, query)
@@ -0,0 +1,248 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+from sorl.thumbnail import default
+
+from . import feed, search, thumbnails
+from .models import Comment, Counter, Follow, Group, Post
+
+User = get_user_model()
+BATCH_SIZE = 10000
+SEED_IMAGE = 'posts/seed-{}.webp'
+VOCABULARY_SIZE = 3000
+
+
+def zipf_cum_weights(count, exponent):
+    """Накопленные веса распределения Ципфа: элемент с рангом r
+    выбирается с вероятностью, пропорциональной 1 / r ** exponent."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+@contextmanager
+def explicit_pub_date(*models):
+    """Отключает auto_now_add у pub_date, чтобы bulk_create
+    сохранил заданные даты."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+@contextmanager
+def fast_inserts():
+    """На время засева SQLite не ждёт сброса каждой транзакции
+    на диск: при сбое засев проще повторить."""
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous')
+        synchronous = cursor.fetchone()[0]
+        cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA synchronous = {int(synchronous)}')
+
+
+def bulk_insert(model, objects, batch_size=BATCH_SIZE, **kwargs):
+    """bulk_create пачками, каждая в своей транзакции."""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return
+        with transaction.atomic():
+            model.objects.bulk_create(batch, **kwargs)
+
+
+class Seeder:
+    """Синтетические данные в масштабе продакшена.
+
+    Посты распределены по авторам по Ципфу, подписчики по авторам —
+    тоже по Ципфу с тем же порядком: кто больше пишет, у того больше
+    подписчиков. Комментарии чаще достаются свежим постам."""
+
+    def __init__(self, posts, users=None, groups=50, follows=20,
+                 comments=None, images=20, post_exponent=1.1,
+                 follower_exponent=1.1, days=365, feed_depth=20, seed=0,
+                 batch_size=BATCH_SIZE, log=None):
+        self.posts = posts
+        self.users = users or max(posts // 20, 50)
+        self.groups = groups
+        self.follows = min(follows, self.users - 1)
+        self.comments = posts // 2 if comments is None else comments
+        self.images = images
+        self.post_exponent = post_exponent
+        self.follower_exponent = follower_exponent
+        self.days = days
+        self.feed_depth = feed_depth
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.log = log or (lambda message: None)
+        self.prefix = f'seed{User.objects.count()}'
+
+    def run(self):
+        self.vocabulary = self.fake.words(VOCABULARY_SIZE)
+        with fast_inserts():
+            users = self.create_users()
+            groups = self.create_groups()
+            images = self.create_images()
+            posts = self.create_posts(users, groups, images)
+            self.create_follows(users)
+            self.create_comments(users, posts)
+            self.refresh()
+
+    def insert(self, model, objects, **kwargs):
+        bulk_insert(model, objects, self.batch_size, **kwargs)
+
+    def text(self, low, high):
+        return ' '.join(
+            self.rng.choices(self.vocabulary, k=self.rng.randint(low, high))
+        ).capitalize()
+
+    def create_users(self):
+        self.log(f'Пользователи: {self.users}')
+        self.insert(User, (
+            User(
+                username=f'{self.prefix}-{number}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password='!',
+            )
+            for number in range(self.users)
+        ))
+        return list(User.objects.filter(
+            username__startswith=f'{self.prefix}-'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_groups(self):
+        self.log(f'Группы: {self.groups}')
+        self.insert(Group, (
+            Group(
+                title=self.fake.catch_phrase()[:200],
+                slug=f'{self.prefix}-{number}',
+                description=self.text(5, 20),
+            )
+            for number in range(self.groups)
+        ))
+        return list(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_images(self):
+        """Несколько общих картинок с готовыми миниатюрами."""
+        self.log(f'Картинки: {self.images}')
+        names = []
+        for number in range(self.images):
+            name = SEED_IMAGE.format(number)
+            # Цвет выбирается и для уже сохранённой картинки: иначе
+            # остальные данные зависели бы от содержимого MEDIA_ROOT
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                Image.new('RGB', (1280, 800), color).save(buffer, 'WEBP')
+                name = default_storage.save(
+                    name, ContentFile(buffer.getvalue()))
+            for geometry_string, options in thumbnails.POST_THUMBNAILS:
+                default.backend.generate(
+                    name, geometry_string, **options)
+            names.append(name)
+        return names
+
+    def create_posts(self, users, groups, images):
+        self.log(f'Посты: {self.posts}')
+        authors = zipf_cum_weights(len(users), self.post_exponent)
+        clusters = zipf_cum_weights(len(groups), 1.0) if groups else None
+        start = timezone.now() - timedelta(days=self.days)
+        step = timedelta(days=self.days) / max(self.posts, 1)
+
+        def build():
+            for number in range(self.posts):
+                group = None
+                if groups and self.rng.random() < 2 / 3:
+                    group = self.rng.choices(groups, cum_weights=clusters)[0]
+                yield Post(
+                    author_id=self.rng.choices(users, cum_weights=authors)[0],
+                    group_id=group,
+                    text=self.text(5, 60),
+                    image=(
+                        self.rng.choice(images)
+                        if images and number % 5 == 0 else ''
+                    ),
+                    pub_date=start + step * number,
+                )
+
+        with explicit_pub_date(Post):
+            self.insert(Post, build())
+        return list(Post.objects.filter(
+            author__username__startswith=f'{self.prefix}-'
+        ).order_by('id').values_list('id', 'pub_date'))
+
+    def create_follows(self, users):
+        self.log(f'Подписки: {self.users} x {self.follows}')
+        weights = zipf_cum_weights(len(users), self.follower_exponent)
+
+        def build():
+            for user in users:
+                chosen = set()
+                while len(chosen) < self.follows:
+                    chosen.update(self.rng.choices(
+                        users, cum_weights=weights,
+                        k=self.follows - len(chosen),
+                    ))
+                    chosen.discard(user)
+                for author in chosen:
+                    yield Follow(user_id=user, author_id=author)
+
+        self.insert(Follow, build(), ignore_conflicts=True)
+
+    def create_comments(self, users, posts):
+        self.log(f'Комментарии: {self.comments}')
+        if not posts:
+            return
+        # Свежие посты обсуждают чаще: ранг 1 у самого нового
+        recent = zipf_cum_weights(len(posts), 0.8)
+        newest_first = posts[::-1]
+
+        def build():
+            for _ in range(self.comments):
+                post_id, pub_date = self.rng.choices(
+                    newest_first, cum_weights=recent)[0]
+                yield Comment(
+                    post_id=post_id,
+                    author_id=self.rng.choice(users),
+                    text=self.text(3, 30),
+                    pub_date=pub_date + timedelta(
+                        minutes=self.rng.randint(1, 60 * 24)),
+                )
+
+        with explicit_pub_date(Comment):
+            self.insert(Comment, build())
+
+    def refresh(self):
+        """Пересчитывает то, что обычно поддерживают сигналы."""
+        self.log('Ленты, счётчики и поисковый индекс')
+        Counter.objects.all().delete()
+        feed.rebuild(self.feed_depth)
+        search.get_backend().rebuild()
+        cache.clear()
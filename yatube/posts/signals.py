@@ -0,0 +1,214 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import comments, counters, feed, groups, search, versions
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+USER_LOGIN_FIELDS = frozenset({'last_login'})
+
+# Посты и авторы, удаляемые в этом потоке. Их комментарии удаляются
+# каскадом раньше них самих, и обрабатывать каждый не нужно: счётчики,
+# страницы комментариев и списки обновляются один раз на пост.
+_deleting = threading.local()
+
+
+def _deleting_ids(kind):
+    if not hasattr(_deleting, kind):
+        setattr(_deleting, kind, set())
+    return getattr(_deleting, kind)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминает прежнюю группу поста перед редактированием."""
+    instance._previous_group_id = None
+    if instance.pk:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(counters.POSTS_TOTAL)
+        counters.increment(counters.author_posts(instance.author_id))
+        if instance.group_id:
+            counters.increment(counters.group_posts(instance.group_id))
+        counters.start(counters.post_comments(instance.pk))
+        feed.fan_out(instance)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id:
+            counters.increment(counters.group_posts(previous_group_id), -1)
+        if instance.group_id:
+            counters.increment(counters.group_posts(instance.group_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def expire_post_lists(sender, instance, **kwargs):
+    scopes = [versions.INDEX, versions.author_scope(instance.author_id)]
+    for group_id in {
+        instance.group_id, getattr(instance, '_previous_group_id', None)
+    }:
+        if group_id:
+            scopes.append(versions.group_scope(group_id))
+    versions.bump(*scopes)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def expire_group_lists(sender, instance, **kwargs):
+    versions.bump(versions.INDEX, versions.group_scope(instance.pk))
+    groups.expire()
+
+
+@receiver(post_save, sender=User)
+def expire_author_lists(sender, instance, created, update_fields, **kwargs):
+    """Имя автора выводится в карточках постов. Вход пользователя
+    обновляет только last_login и кэш не трогает."""
+    if created or (update_fields and update_fields <= USER_LOGIN_FIELDS):
+        return
+    group_ids = Post.objects.filter(
+        author_id=instance.pk, group__isnull=False).order_by().values_list(
+        'group_id', flat=True).distinct()
+    versions.bump(
+        versions.INDEX, versions.author_scope(instance.pk),
+        *(versions.group_scope(group_id) for group_id in group_ids))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields, **kwargs):
+    if update_fields and 'text' not in update_fields:
+        return
+    search.get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.increment(counters.POSTS_TOTAL, -1)
+    counters.increment(counters.author_posts(instance.author_id), -1)
+    if instance.group_id:
+        counters.increment(counters.group_posts(instance.group_id), -1)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post(sender, instance, **kwargs):
+    _deleting_ids('posts').add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def reset_comment_counter(sender, instance, **kwargs):
+    _deleting_ids('posts').discard(instance.pk)
+    counters.reset(counters.post_comments(instance.pk))
+    comments.expire_all(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def reset_group_counter(sender, instance, **kwargs):
+    counters.reset(counters.group_posts(instance.pk))
+
+
+def expire_commented_post_lists(comment):
+    """Число комментариев выводится в карточке поста внутри
+    закэшированных списков: они устаревают вместе со счётчиком."""
+    if Comment.post.is_cached(comment):
+        row = (comment.post.author_id, comment.post.group_id)
+    else:
+        row = Post.objects.filter(pk=comment.post_id).values_list(
+            'author_id', 'group_id').first()
+    if row is not None:
+        versions.bump(*_post_list_scopes(*row))
+
+
+def _post_list_scopes(author_id, group_id):
+    scopes = [versions.INDEX, versions.author_scope(author_id)]
+    if group_id:
+        scopes.append(versions.group_scope(group_id))
+    return scopes
+
+
+@receiver(post_save, sender=Comment)
+def expire_comment_pages(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(counters.post_comments(instance.post_id))
+        comments.expire_tail(instance.post_id)
+        expire_commented_post_lists(instance)
+    else:
+        comments.expire_all(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def expire_deleted_comment_pages(sender, instance, **kwargs):
+    if (
+        instance.post_id in _deleting_ids('posts')
+        or instance.author_id in _deleting_ids('authors')
+    ):
+        return
+    counters.increment(counters.post_comments(instance.post_id), -1)
+    comments.expire_all(instance.post_id)
+    expire_commented_post_lists(instance)
+
+
+@receiver(pre_delete, sender=User)
+def remember_deleted_author(sender, instance, **kwargs):
+    """Запоминает, сколько комментариев удаляемый пользователь оставил
+    под чужими постами: они удаляются вместе с ним."""
+    _deleting_ids('authors').add(instance.pk)
+    instance._commented_posts = list(
+        Comment.objects.filter(author_id=instance.pk).exclude(
+            post__author_id=instance.pk).order_by().values_list(
+            'post_id', 'post__author_id', 'post__group_id').annotate(
+            count=Count('id')))
+
+
+@receiver(post_delete, sender=User)
+def expire_deleted_author_comments(sender, instance, **kwargs):
+    _deleting_ids('authors').discard(instance.pk)
+    scopes = set()
+    for post_id, author_id, group_id, count in getattr(
+        instance, '_commented_posts', ()
+    ):
+        counters.increment(counters.post_comments(post_id), -count)
+        comments.expire_all(post_id)
+        scopes.update(_post_list_scopes(author_id, group_id))
+    versions.bump(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_follow_pages(sender, instance, **kwargs):
+    versions.bump(
+        versions.follows_scope(instance.user_id),
+        versions.follows_scope(instance.author_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        counters.increment(counters.author_followers(instance.author_id))
+        counters.increment(counters.author_following(instance.user_id))
+        feed.update_celebrity(instance.author_id)
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    counters.increment(counters.author_followers(instance.author_id), -1)
+    counters.increment(counters.author_following(instance.user_id), -1)
+    feed.update_celebrity(instance.author_id)
+    feed.prune(instance.user_id, instance.author_id)
@@ -0,0 +1,145 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(POSTS_PER_PAGE=3, COMMENTS_PER_PAGE=2)
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}',
+                group=cls.group if number % 2 else None)
+            for number in range(5)
+        ]
+        cls.post = cls.posts[-1]
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def walk(self, url, client=None, **params):
+        """Все страницы списка по курсорам."""
+        client = client or self.client
+        results, cursor = [], ''
+        while cursor is not None:
+            data = client.get(url, {**params, 'cursor': cursor}).json()
+            results.extend(data['results'])
+            cursor = data['next']
+        return results
+
+    def test_lists_walk_by_cursor(self):
+        """Списки листаются курсором, новые посты первыми."""
+        expected = [post.pk for post in reversed(self.posts)]
+        urls = (
+            (reverse('posts:api_index'), self.client),
+            (reverse('posts:api_profile', args=('author',)), self.client),
+            (reverse('posts:api_follow_index'), self.reader_client),
+        )
+        for url, client in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    [post['id'] for post in self.walk(url, client)],
+                    expected)
+        self.assertEqual(
+            [post['id'] for post in self.walk(
+                reverse('posts:api_group_posts', args=('group',)))],
+            [post.pk for post in reversed(self.posts) if post.group_id])
+
+    def test_compact_post(self):
+        """Пост со связями по умолчанию; комментарии по запросу."""
+        data = self.client.get(reverse('posts:api_index'), {
+            'fields[post]': 'id,author,group,comments'}).json()
+        self.assertEqual(data['results'][0], {
+            'id': self.post.pk, 'author': 'author', 'group': None,
+            'comments': 3})
+        self.assertEqual(data['results'][1]['group'], 'group')
+        data = self.client.get(reverse('posts:api_index')).json()
+        self.assertEqual(set(data['results'][0]), {
+            'id', 'text', 'author', 'group', 'pub_date', 'image'})
+
+    def test_sparse_fields_skip_joins(self):
+        """Незапрошенные связи не подтягиваются из базы."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:api_index'), {'fields[post]': 'id,text'})
+        self.assertNotIn('JOIN', queries[0]['sql'])
+
+    def test_post_detail_comments(self):
+        """Пост с первой страницей комментариев и курсором дальше."""
+        url = reverse('posts:api_post_detail', args=(self.post.pk,))
+        data = self.client.get(url, {'fields[comment]': 'text'}).json()
+        self.assertEqual(data['post']['text'], self.post.text)
+        self.assertEqual(
+            data['comments']['results'],
+            [{'text': 'Комментарий 0'}, {'text': 'Комментарий 1'}])
+        data = self.client.get(
+            url, {'cursor': data['comments']['next']}).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']['results']],
+            ['Комментарий 2'])
+
+    def test_profile_counts(self):
+        data = self.reader_client.get(
+            reverse('posts:api_profile', args=('author',))).json()
+        self.assertEqual(data['author'], {
+            'username': 'author', 'full_name': 'Лев Толстой',
+            'posts_count': 5, 'followers_count': 1, 'following_count': 0,
+            'following': True})
+
+    def test_errors(self):
+        """Ошибки отдаются в JSON с подходящим статусом."""
+        cases = (
+            (reverse('posts:api_index'), {'cursor': 'bad'}, 400),
+            (reverse('posts:api_index'), {'limit': '1000'}, 400),
+            (reverse('posts:api_index'), {'fields[post]': 'password'}, 400),
+            (reverse('posts:api_profile', args=('nobody',)), {}, 404),
+            (reverse('posts:api_post_detail', args=(0,)), {}, 404),
+            (reverse('posts:api_follow_index'), {}, 401),
+        )
+        for url, params, status in cases:
+            with self.subTest(url=url, params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+        response = self.client.post(reverse('posts:api_index'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_query_budget(self):
+        """Число запросов совпадает с указанным в posts.api."""
+        budgets = (
+            (self.client, reverse('posts:api_index'), {}, 1),
+            (self.client, reverse('posts:api_index'),
+             {'fields[post]': 'id,comments'}, 2),
+            (self.client,
+             reverse('posts:api_group_posts', args=('group',)), {}, 2),
+            (self.client,
+             reverse('posts:api_profile', args=('author',)), {}, 3),
+            (self.reader_client, reverse('posts:api_follow_index'), {}, 4),
+            (self.client,
+             reverse('posts:api_post_detail', args=(self.post.pk,)), {}, 2),
+        )
+        for client, url, params, budget in budgets:
+            with self.subTest(url=url, params=params):
+                client.get(url, params)
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    client.get(url, params)
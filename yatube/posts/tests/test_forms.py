@@ -1,8 +1,14 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
+from core.tests.utils import TempMediaRootMixin, make_image
+from core.uploadhandlers import LimitedTemporaryFileUploadHandler
+from posts.forms import PostForm
 from posts.models import Group, Post, Comment
 
 User = get_user_model()
@@ -140,3 +146,123 @@ class PostCreateFormTests(TestCase):
             data=form_data,
         )
         self.assertEqual(form_data['text'], Comment.objects.first().text)
+
+
+@override_settings(
+    POST_IMAGE_MAX_SIZE=100,
+    POST_IMAGE_MAX_PIXELS=1000 * 1000,
+    FILE_UPLOAD_MAX_SIZE=64 * 1024,
+    THUMBNAIL_WORKERS=0,
+)
+class PostImageIngestTest(TempMediaRootMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'text', 'image': image},
+        )
+
+    def test_image_is_downscaled_and_reencoded(self):
+        """Картинка сохраняется уменьшенной, в WEBP и без EXIF."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        self.create_post(
+            make_image((400, 200), 'photo.jpg', 'JPEG', exif=exif))
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('photo.webp'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn('exif', image.info)
+
+    def test_too_many_pixels_rejected_before_decoding(self):
+        """Картинка с большим разрешением отклоняется по заголовку."""
+        with self.settings(FILE_UPLOAD_MAX_SIZE=10 * 1024 * 1024):
+            image = make_image((2000, 1000), 'photo.jpg')
+            with mock.patch('PIL.ImageFile.ImageFile.load') as load:
+                response = self.create_post(image)
+        load.assert_not_called()
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'too_many_pixels'))
+
+    def test_too_large_file_rejected(self):
+        """Файл больше FILE_UPLOAD_MAX_SIZE не сохраняется,
+        а остаток тела запроса не читается."""
+        image = SimpleUploadedFile(
+            'big.jpg', b'\xff' * (1024 * 1024), 'image/jpeg')
+        with mock.patch(
+            'core.uploadhandlers.LimitedTemporaryFileUploadHandler'
+            '.receive_data_chunk', autospec=True,
+            side_effect=LimitedTemporaryFileUploadHandler.receive_data_chunk,
+        ) as receive:
+            response = self.create_post(image)
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'file_too_large'))
+        received = sum(len(call[0][1]) for call in receive.call_args_list)
+        self.assertLess(received, 256 * 1024)
+
+    def test_invalid_image_rejected(self):
+        """Файл, который не является картинкой, отклоняется."""
+        image = SimpleUploadedFile('text.jpg', b'not an image', 'image/jpeg')
+        response = self.create_post(image)
+        self.assertFalse(Post.objects.exists())
+        self.assertTrue(response.context['form'].has_error(
+            'image', 'invalid_image'))
+
+
+class PostFormGroupChoiceTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Первая группа', slug='first', description='Описание')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_form_build_does_not_query_groups(self):
+        """Форма строится и выводится без запросов, сколько бы ни было
+        групп; при проверке остаётся только проверка ключа группы."""
+        for number in range(50):
+            Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description='Описание')
+        PostForm().as_p()
+        with self.assertNumQueries(0):
+            html = PostForm().as_p()
+        form = PostForm({'text': 'Пост', 'group': self.group.pk})
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+        self.assertIn('Группа 49', html)
+        self.assertEqual(form.cleaned_data['group'], self.group)
+
+    def test_group_changes_update_choices(self):
+        """Изменение и удаление группы сразу видны в форме."""
+        PostForm().as_p()
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.assertIn('Новое название', PostForm().as_p())
+        group_id = self.group.pk
+        self.group.delete()
+        form = PostForm({'text': 'Пост', 'group': group_id})
+        self.assertFalse(form.is_valid())
+        self.assertIn('group', form.errors)
+
+    def test_default_group_from_settings(self):
+        """Группа по умолчанию задаётся настройкой POST_DEFAULT_GROUP."""
+        self.assertIsNone(PostForm()['group'].value())
+        with override_settings(POST_DEFAULT_GROUP=self.group.slug):
+            self.assertEqual(PostForm()['group'].value(), self.group.pk)
+            response = self.client.get(reverse('posts:post_create'))
+            self.assertContains(
+                response, f'<option value="{self.group.pk}" selected>')
@@ -1,7 +1,17 @@
+import os
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.test import TestCase
+from django.urls import reverse
 
-from ..models import Group, Post
+from .. import counters, feed
+from ..counters import (
+    comment_counts, follower_count, following_count, post_count, reconcile
+)
+from ..feed import feed_for
+from ..models import Comment, Counter, FeedEntry, Follow, Group, Post
 
 User = get_user_model()
 
@@ -33,3 +43,210 @@ class PostModelTest(TestCase):
         group_post = self.post.group
         expected_object_name = group_post.title
         self.assertEqual(expected_object_name, str(group_post))
+
+
+class PostCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='group',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-group',
+            description='Тестовое описание',
+        )
+        Post.objects.create(author=cls.user, text='Первый пост')
+
+    def assertCounts(self, total, author, group, other_group):
+        self.assertEqual(post_count(), total)
+        self.assertEqual(post_count(author_id=self.user.id), author)
+        self.assertEqual(post_count(group_id=self.group.id), group)
+        self.assertEqual(
+            post_count(group_id=self.other_group.id), other_group)
+
+    def test_counters_follow_post_changes(self):
+        """Счётчики постов меняются при создании, правке и удалении."""
+        self.assertCounts(1, 1, 0, 0)
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group)
+        self.assertCounts(2, 2, 1, 0)
+        post.group = self.other_group
+        post.save()
+        self.assertCounts(2, 2, 0, 1)
+        post.delete()
+        self.assertCounts(1, 1, 0, 0)
+
+
+class ActivityCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertFollows(self, followers, following):
+        self.assertEqual(follower_count(self.author.id), followers)
+        self.assertEqual(following_count(self.user.id), following)
+
+    def test_comment_counter(self):
+        """add_comment увеличивает счётчик, удаление уменьшает."""
+        self.assertEqual(comment_counts([self.post.id]), {self.post.id: 0})
+        for text in ('Первый', 'Второй'):
+            self.client.post(
+                reverse('posts:add_comment', args=(self.post.id,)),
+                {'text': text},
+            )
+        self.assertEqual(comment_counts([self.post.id]), {self.post.id: 2})
+        Comment.objects.filter(post=self.post).first().delete()
+        self.assertEqual(comment_counts([self.post.id]), {self.post.id: 1})
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют оба счётчика подписок."""
+        self.assertFollows(0, 0)
+        self.client.get(
+            reverse('posts:profile_follow', args=(self.author.username,)))
+        self.assertFollows(1, 1)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,)))
+        self.assertFollows(0, 0)
+
+    def test_pages_show_counters(self):
+        """Главная выводит число комментариев, профиль — подписки."""
+        Comment.objects.create(post=self.post, author=self.user, text='К')
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'комментариев: 1')
+        response = self.client.get(
+            reverse('posts:profile', args=(self.author.username,)))
+        self.assertEqual(response.context['followers_count'], 1)
+        self.assertEqual(response.context['following_count'], 0)
+
+    def test_reconcile_repairs_drift(self):
+        """reconcile исправляет разошедшиеся счётчики."""
+        Comment.objects.create(post=self.post, author=self.user, text='К')
+        comment_counts([self.post.id])
+        follower_count(self.author.id)
+        Counter.objects.update(value=42)
+        self.assertEqual(reconcile(dry_run=True)['comments:'], 1)
+        self.assertEqual(comment_counts([self.post.id]), {self.post.id: 42})
+        call_command('reconcile_counters', stdout=open(os.devnull, 'w'))
+        self.assertEqual(comment_counts([self.post.id]), {self.post.id: 1})
+        self.assertEqual(follower_count(self.author.id), 0)
+        self.assertFalse(any(reconcile().values()))
+
+    def test_post_delete_resets_comment_counter(self):
+        Comment.objects.create(post=self.post, author=self.user, text='К')
+        comment_counts([self.post.id])
+        post_id = self.post.id
+        Post.objects.filter(pk=post_id).delete()
+        self.assertFalse(Counter.objects.filter(
+            name=counters.post_comments(post_id)).exists())
+
+    def test_post_delete_queries_do_not_grow_with_comments(self):
+        """Комментарии удаляемого поста не обрабатываются по одному."""
+        for size in (10, 100):
+            with self.subTest(size=size):
+                post = Post.objects.create(author=self.author, text='Пост')
+                Comment.objects.bulk_create([
+                    Comment(post=post, author=self.user, text='К')
+                    for _ in range(size)
+                ])
+                with self.assertNumQueries(8):
+                    post.delete()
+
+    def test_author_delete_updates_commented_posts(self):
+        """Удаление пользователя обновляет счётчики чужих постов
+        одним запросом на пост, а не на комментарий."""
+        reader = User.objects.create_user(username='gone')
+        own_post = Post.objects.create(author=reader, text='Свой пост')
+        Comment.objects.bulk_create([
+            Comment(post=post, author=reader, text='К')
+            for post in (self.post, own_post) for _ in range(50)
+        ])
+        Comment.objects.create(post=self.post, author=self.user, text='К')
+        reconcile()
+        self.assertEqual(comment_counts([self.post.id]), {self.post.id: 51})
+        with self.assertNumQueries(19):
+            reader.delete()
+        self.assertEqual(comment_counts([self.post.id]), {self.post.id: 1})
+        self.assertFalse(any(reconcile(dry_run=True).values()))
+
+
+class FeedIndexTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена."""
+        Follow.objects.create(user=self.user, author=self.author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.user, author=self.author)
+
+    def test_feeds_use_indexes(self):
+        """Ленты выбираются по составным индексам без сортировки."""
+        feeds = {
+            'post_pub_date_idx': Post.objects.for_listing(),
+            'post_group_pub_date_idx': Post.objects.filter(group_id=1),
+            'post_author_pub_date_idx': Post.objects.filter(
+                author=self.author),
+        }
+        for index_name, queryset in feeds.items():
+            with self.subTest(index=index_name):
+                plan = queryset[:10].explain()
+                self.assertIn(index_name, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def feed_posts(self):
+        return [entry.post for entry in feed_for(self.reader)]
+
+    def test_follow_backfills_feed(self):
+        """При подписке в ленту попадают прежние посты автора."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed_posts(), [self.old_post])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.feed_posts(), [new_post, self.old_post])
+
+    def test_unfollow_prunes_feed(self):
+        """После отписки посты автора уходят из ленты."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        follow.delete()
+        self.assertEqual(self.feed_posts(), [])
+
+    def test_rebuild_matches_signals(self):
+        """rebuild заполняет ленты так же, как сигналы."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Новый')
+        entries = list(FeedEntry.objects.values_list(
+            'user', 'post', 'pub_date'))
+        feed.rebuild()
+        self.assertCountEqual(
+            FeedEntry.objects.values_list('user', 'post', 'pub_date'),
+            entries,
+        )
+        feed.rebuild(depth=1)
+        self.assertEqual(len(self.feed_posts()), 1)
@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.exact = Post.objects.create(
+            author=cls.user, text='Привет мир, привет всем')
+        cls.other = Post.objects.create(
+            author=cls.user, text='Привет соседям')
+        cls.unrelated = Post.objects.create(
+            author=cls.user, text='Совсем другая запись')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_ranks_matches(self):
+        """Находятся только подходящие посты, более релевантные выше."""
+        self.assertEqual(
+            list(search.search_posts('привет')),
+            [self.exact, self.other],
+        )
+
+    def test_prefix_query(self):
+        """Последнее слово запроса ищется по префиксу."""
+        self.assertEqual(list(search.search_posts('сосед')), [self.other])
+        self.assertEqual(list(search.search_posts('сосед мир')), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Синтаксис FTS5 во вводе пользователя не ломает запрос."""
+        for query in ('"привет', 'привет OR', 'NEAR(привет', '*', ''):
+            with self.subTest(query=query):
+                list(search.search_posts(query))
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        post = Post.objects.get(pk=self.unrelated.pk)
+        post.text = 'Обновлённый текст'
+        post.save()
+        self.assertEqual(list(search.search_posts('обновлённый')), [post])
+        self.assertEqual(list(search.search_posts('другая')), [])
+        post.delete()
+        self.assertEqual(list(search.search_posts('обновлённый')), [])
+
+    def test_rebuild(self):
+        """rebuild восстанавливает индекс постов, созданных bulk_create."""
+        Post.objects.bulk_create([Post(author=self.user, text='массовый')])
+        self.assertEqual(list(search.search_posts('массовый')), [])
+        search.get_backend().rebuild()
+        self.assertEqual(len(search.search_posts('массовый')), 1)
+
+    @mock.patch('posts.views.POSTS_PER_PAGE', 1)
+    def test_search_page(self):
+        """Страница поиска выводит результаты постранично карточками
+        постов, сохраняя запрос в ссылках пагинатора."""
+        response = Client().get(reverse('posts:search'), {'q': 'привет'})
+        self.assertEqual(
+            list(response.context['page_obj']), [self.exact])
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+        self.assertContains(response, '?q=%D0%BF%D1%80%D0%B8%D0%B2%D0%B5%D1'
+                                      '%82&amp;page=2')
+        self.assertTemplateUsed(response, 'posts/includes/post_card.html')
+
+    @mock.patch('posts.views.POSTS_PER_PAGE', 1)
+    def test_search_ignores_cursor(self):
+        """Параметр cursor не переключает поиск на курсор по дате:
+        первым остаётся самый релевантный, а не самый новый пост."""
+        response = Client().get(
+            reverse('posts:search'), {'q': 'привет', 'cursor': ''})
+        self.assertEqual(list(response.context['page_obj']), [self.exact])
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+        response = Client().get(
+            reverse('posts:search_api'), {'q': 'привет', 'cursor': ''})
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['results'][0]['id'], self.exact.id)
+
+    def test_search_api(self):
+        """API поиска отдаёт найденные посты в JSON."""
+        response = Client().get(reverse('posts:search_api'), {'q': 'сосед'})
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['id'], self.other.id)
+        self.assertEqual(
+            data['results'][0]['url'],
+            reverse('posts:post_detail', args=(self.other.id,)),
+        )
+
+    def test_admin_search(self):
+        """Поиск в админке использует поисковый индекс."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'соседям'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.other])
+
+    def test_like_backend(self):
+        """Запасной бэкенд ищет без индекса."""
+        backend = search.LikeBackend()
+        self.assertEqual(
+            list(backend.search(Post.objects.all(), 'соседям')),
+            [self.other],
+        )
@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.tests.utils import TempMediaRootMixin
+from posts.counters import post_count
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+from posts.search import search_posts
+from posts.seeding import Seeder
+
+
+class SeederTest(TempMediaRootMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Seeder(
+            200, users=20, groups=3, follows=5, comments=100, images=2,
+        ).run()
+
+    def test_rows_created(self):
+        """Создаётся заданное число строк."""
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertEqual(Follow.objects.count(), 20 * 5)
+        self.assertEqual(Post.objects.exclude(image='').count(), 40)
+
+    def test_pub_dates_kept(self):
+        """bulk_create сохраняет заданные даты публикации."""
+        dates = list(Post.objects.order_by('id').values_list(
+            'pub_date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertLess(dates[0], dates[-1])
+
+    def test_posts_skewed_by_author(self):
+        """Посты распределены по авторам неравномерно."""
+        counts = sorted(
+            (post_count(author_id=author_id) for author_id in
+             Post.objects.values_list('author', flat=True).distinct()),
+            reverse=True,
+        )
+        self.assertGreater(counts[0], 200 / 20 * 2)
+
+    def test_derived_data_refreshed(self):
+        """Ленты, счётчики и поисковый индекс соответствуют данным."""
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertEqual(post_count(), 200)
+        post = Post.objects.first()
+        self.assertIn(post, search_posts(post.text.split()[0]))
+
+
+class SeedCommandTest(TempMediaRootMixin, TestCase):
+
+    def test_seed(self):
+        """Команда seed передаёт параметры генератору."""
+        call_command(
+            'seed', posts=30, users=5, groups=2, follows=2, comments=7,
+            images=1, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 7)
+        self.assertEqual(Follow.objects.count(), 5 * 2)
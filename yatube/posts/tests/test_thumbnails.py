@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from core.tests.utils import TempMediaRootMixin, make_image
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+
+def run_on_commit(func):
+    func()
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class PregeneratedThumbnailTest(TempMediaRootMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_missing_thumbnail_is_placeholder(self):
+        """Пока миниатюры нет, отдаётся заглушка, а картинка
+        не открывается во время запроса."""
+        post = Post.objects.create(
+            author=self.user, text='text', image=make_image())
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue, \
+                mock.patch('sorl.thumbnail.engines.pil_engine.Image.open') \
+                as image_open:
+            thumbnail = default.backend.get_thumbnail(
+                post.image, '960x339', crop='center', upscale=True)
+        image_open.assert_not_called()
+        enqueue.assert_called_once_with(
+            post.image.name, '960x339', {'crop': 'center', 'upscale': True})
+        self.assertIsInstance(thumbnail, thumbnails.PlaceholderImageFile)
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+        self.assertIn(settings.THUMBNAIL_PLACEHOLDER, thumbnail.url)
+
+    def test_generated_thumbnail_is_served(self):
+        """Созданная заранее миниатюра отдаётся из хранилища sorl."""
+        post = Post.objects.create(
+            author=self.user, text='text', image=make_image())
+        generated = default.backend.generate(
+            post.image, '960x600', crop='center', upscale=True)
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            thumbnail = default.backend.get_thumbnail(
+                post.image, '960x600', crop='center', upscale=True)
+        enqueue.assert_not_called()
+        self.assertEqual(thumbnail.url, generated.url)
+
+    def test_post_create_generates_all_sizes(self):
+        """После создания поста готовы все размеры миниатюр."""
+        with mock.patch('django.db.transaction.on_commit', run_on_commit):
+            self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'text', 'image': make_image()},
+            )
+        post = Post.objects.get()
+        for geometry_string, options in thumbnails.POST_THUMBNAILS:
+            with self.subTest(geometry=geometry_string):
+                thumbnail = default.backend.get_thumbnail(
+                    post.image, geometry_string, **options)
+                self.assertNotIsInstance(
+                    thumbnail, thumbnails.PlaceholderImageFile)
+
+    def test_generated_thumbnail_replaces_placeholder_in_lists(self):
+        """После создания миниатюры закэшированные списки
+        показывают её вместо заглушки."""
+        post = Post.objects.create(
+            author=self.user, text='text', image=make_image())
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user.username,)),
+        )
+        with mock.patch.object(thumbnails, 'enqueue'):
+            for url in urls:
+                self.assertContains(
+                    self.client.get(url), settings.THUMBNAIL_PLACEHOLDER)
+        geometry_string, options = thumbnails.POST_THUMBNAILS[0]
+        thumbnails._generate(post.image.name, geometry_string, options, '')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(
+                    response, settings.THUMBNAIL_PLACEHOLDER)
+                self.assertContains(response, '/media/cache/')
+
+    def test_enqueue_is_deduplicated(self):
+        """Одна миниатюра не ставится в очередь дважды."""
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            thumbnails.enqueue('a.png', '960x600', {})
+            thumbnails.enqueue('a.png', '960x600', {})
+        self.assertEqual(on_commit.call_count, 1)
@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import feed
+from ..counters import comment_counts, follower_count, post_count
+from ..feed import feed_for
+from ..models import Comment, Follow, Group, Post
+from ..search import search_posts
+from ..transfer import export, load
+
+User = get_user_model()
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост в группе', group=cls.group)
+        Post.objects.create(author=cls.author, text='Пост без группы')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def snapshot(self):
+        return list(export())
+
+    def test_round_trip(self):
+        """Выгрузка, очистка и загрузка восстанавливают данные,
+        счётчики и ленты."""
+        lines = self.snapshot()
+        self.assertEqual(
+            [json.loads(line)['model'] for line in lines],
+            ['group', 'post', 'post', 'comment', 'follow'],
+        )
+        pub_date = self.post.pub_date
+        for model in (Group, Post, User):
+            model.objects.all().delete()
+        stats = load(lines, batch_size=1)
+        self.assertEqual(stats['post', 'created'], 2)
+        self.assertEqual(self.snapshot(), lines)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(post_count(author_id=post.author_id), 2)
+        self.assertEqual(comment_counts([post.pk]), {post.pk: 1})
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertEqual(follower_count(post.author_id), 1)
+        self.assertEqual(len(feed_for(reader)), 2)
+
+    def test_existing_objects_are_skipped(self):
+        """Повторная загрузка ничего не дублирует."""
+        lines = self.snapshot()
+        stats = load(lines)
+        self.assertEqual(sum(
+            number for (_, outcome), number in stats.items()
+            if outcome == 'created'), 0)
+        self.assertEqual(stats['post', 'skipped'], 2)
+        self.assertEqual(self.snapshot(), lines)
+
+    @override_settings(FEED_BACKFILL_SIZE=1)
+    def test_load_updates_only_imported_objects(self):
+        """Загруженные посты рассылаются и индексируются, по новым
+        подпискам ленты дополняются, а не пересобираются целиком:
+        разосланные раньше записи остаются."""
+        listener = User.objects.create_user(username='listener')
+        post = json.loads(self.snapshot()[1])
+        post['pk'] = Post.objects.latest('pk').pk + 1
+        post['fields']['text'] = 'Загруженный пост'
+        post['fields']['pub_date'] = (
+            Post.objects.latest('pub_date').pub_date + timedelta(days=1)
+        ).isoformat()
+        follow = {
+            'model': 'follow',
+            'pk': Follow.objects.latest('pk').pk + 1,
+            'fields': {'user': 'listener', 'author': 'writer'},
+        }
+        with mock.patch.object(feed, 'rebuild') as rebuild:
+            load([json.dumps(post), json.dumps(follow)])
+        rebuild.assert_not_called()
+        self.assertEqual(len(feed_for(self.reader)), 3)
+        self.assertEqual(
+            [entry.post_id for entry in feed_for(listener)], [post['pk']])
+        self.assertEqual(
+            [found.pk for found in search_posts('загруженный')],
+            [post['pk']],
+        )
+
+    def test_loaded_posts_expire_cached_pages(self):
+        """Загрузка сбрасывает версии закэшированных списков,
+        а не весь кэш."""
+        cache.clear()
+        record = json.loads(self.snapshot()[1])
+        record['pk'] = Post.objects.latest('pk').pk + 1
+        record['fields']['text'] = 'Загруженный пост'
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        etag = self.client.get(url)['ETag']
+        cache.set('unrelated', 1)
+        load([json.dumps(record)])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Загруженный пост')
+        self.assertEqual(cache.get('unrelated'), 1)
+
+    def test_commands(self):
+        """export_posts пишет файл, который читает import_posts."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.ndjson')
+            call_command('export_posts', models='group,post', output=path)
+            Post.objects.all().delete()
+            call_command(
+                'import_posts', path, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_streaming_view(self):
+        """Выгрузка доступна персоналу и отдаётся потоком."""
+        url = reverse('posts:export')
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url, {'models': 'post'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(
+            self.client.get(url, {'models': 'user'}).status_code, 400)
@@ -1,12 +1,15 @@
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from posts.models import Group, Post, Follow
+from posts.comments import comments_page
+from posts.models import Comment, FeedEntry, Group, Post, Follow
 
 User = get_user_model()
 POSTS_PER_PAGE = settings.POSTS_PER_PAGE
@@ -170,17 +173,41 @@ class PostsPagesTests(TestCase):
         self.assertEqual(first_object.text, self.post.text)
 
     def test_index_page_cache(self):
-        """Данные главной страницы остаются в кеше."""
+        """Данные главной страницы остаются в кеше,
+        пока посты не изменились."""
         post = Post.objects.create(
             text='test cache',
             author=self.user
         )
         response_index = self.guest_client.get(self.INDEX_REVERSE).content
-        post.delete()
+        Post.objects.filter(pk=post.pk).update(text='changed quietly')
         cache_index = self.guest_client.get(self.INDEX_REVERSE).content
         self.assertEqual(response_index, cache_index)
-        cache.clear()
-        self.assertIsNot(response_index, cache_index)
+        post.delete()
+        fresh_index = self.guest_client.get(self.INDEX_REVERSE).content
+        self.assertNotIn(b'test cache', fresh_index)
+
+    def test_post_lists_expire_on_edit(self):
+        """После правки поста списки постов не показывают старый текст."""
+        urls = (self.INDEX_REVERSE, self.GROUP_REVERSE, self.PROFILE_REVERSE)
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'edited text'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'edited text')
+
+    def test_post_lists_expire_on_group_change(self):
+        """Пост пропадает из кэша прежней группы после переноса."""
+        self.guest_client.get(self.GROUP_REVERSE)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = None
+        post.save()
+        response = self.guest_client.get(self.GROUP_REVERSE)
+        self.assertNotContains(response, 'дата публикации')
 
     def test_authorized_user_can_subscribe(self):
         """Авторизованный пользователь может подписываться на
@@ -264,3 +291,472 @@ class PaginatorViewsTest(TestCase):
                 len(response.context['page_obj']),
                 Post.objects.count() % POSTS_PER_PAGE
             )
+
+    def test_cursor_pages_cover_all_posts(self):
+        """Keyset-пагинация по курсору обходит все посты без повторов."""
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        for reverse_name in (
+            self.INDEX_REVERSE,
+            self.GROUP_REVERSE,
+            self.PROFILE_REVERSE,
+        ):
+            with self.subTest(url=reverse_name):
+                seen = []
+                cursor = ''
+                while cursor is not None:
+                    response = self.client.get(
+                        reverse_name, {'cursor': cursor})
+                    page_obj = response.context['page_obj']
+                    seen.extend(page_obj)
+                    cursor = page_obj.next_cursor
+                self.assertEqual(seen, expected)
+
+    def test_cursor_previous_page(self):
+        """Курсор предыдущей страницы возвращает первую страницу."""
+        first = self.client.get(self.INDEX_REVERSE, {'cursor': ''})
+        first_page = first.context['page_obj']
+        self.assertFalse(first_page.has_previous())
+        second = self.client.get(
+            self.INDEX_REVERSE, {'cursor': first_page.next_cursor})
+        second_page = second.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        previous = self.client.get(
+            self.INDEX_REVERSE, {'cursor': second_page.previous_cursor})
+        self.assertEqual(
+            list(previous.context['page_obj']), list(first_page))
+
+    def test_cursor_page_skips_count(self):
+        """Keyset-страница не выполняет COUNT."""
+        self.client.get(self.INDEX_REVERSE)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.INDEX_REVERSE, {'cursor': ''})
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор открывает первую страницу."""
+        response = self.client.get(self.INDEX_REVERSE, {'cursor': 'bad'})
+        self.assertEqual(len(response.context['page_obj']), POSTS_PER_PAGE)
+
+    def test_offset_pages_use_counters(self):
+        """Страницы со списками постов не выполняют COUNT."""
+        for reverse_name in (
+            self.INDEX_REVERSE,
+            self.GROUP_REVERSE,
+            self.PROFILE_REVERSE,
+        ):
+            with self.subTest(url=reverse_name):
+                self.client.get(reverse_name, {'page': 2})
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(reverse_name, {'page': 2})
+                self.assertFalse(
+                    any('COUNT(' in query['sql'] for query in queries))
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов страниц не зависит от числа постов
+    и комментариев на них."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other_author = User.objects.create_user(username='other')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Название группы',
+            slug='test-slug',
+            description='Описание группы',
+        )
+        for i in range(POSTS_PER_PAGE):
+            for author in (cls.author, cls.other_author):
+                Post.objects.create(
+                    author=author, text=f'Пост {i}', group=cls.group)
+        cls.post = Post.objects.filter(author=cls.author).first()
+        for i in range(5):
+            for author in (cls.author, cls.other_author, cls.reader):
+                Comment.objects.create(
+                    post=cls.post, author=author, text=f'Комментарий {i}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.other_author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_guest_pages_query_budget(self):
+        """Страницы для гостя укладываются в бюджет запросов."""
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', args=[self.group.slug]): 4,
+            reverse('posts:profile', args=[self.author.username]): 4,
+            reverse('posts:post_detail', args=[self.post.id]): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.client.get(url)
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    self.client.get(url)
+
+    def test_follow_index_query_budget(self):
+        """Лента подписок укладывается в бюджет запросов."""
+        url = reverse('posts:follow_index')
+        self.reader_client.get(url)
+        with self.assertNumQueries(4):
+            self.reader_client.get(url)
+
+    def test_write_views_query_budget(self):
+        """Записи вместе с обновлением счётчиков укладываются
+        в бюджет запросов."""
+        budgets = (
+            ('posts:post_create', (), {'text': 'Новый пост'}, 11),
+            ('posts:add_comment', (self.post.id,), {'text': 'Ещё'}, 5),
+            ('posts:profile_unfollow', (self.author.username,), None, 10),
+        )
+        for name, args, data, budget in budgets:
+            with self.subTest(url=name):
+                url = reverse(name, args=args)
+                # С пустым кэшем список групп и знаменитостей читается
+                # из базы независимо от предыдущих тестов
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    if data is None:
+                        self.reader_client.get(url)
+                    else:
+                        self.reader_client.post(url, data)
+
+    def test_follow_index_cursor_pages(self):
+        """Лента подписок листается курсором без повторов."""
+        url = reverse('posts:follow_index')
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.reader_client.get(url, {'cursor': cursor})
+            page_obj = response.context['page_obj']
+            seen.extend(page_obj)
+            cursor = page_obj.next_cursor
+        self.assertEqual(
+            seen, list(Post.objects.order_by('-pub_date', '-id')))
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS=2)
+class HybridFeedTest(TestCase):
+    """Посты авторов с большим числом подписчиков подмешиваются
+    в ленту при чтении, остальные рассылаются при записи."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        for user in (self.reader, self.fan):
+            Follow.objects.create(user=user, author=self.celebrity)
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(POSTS_PER_PAGE):
+            for author in (self.celebrity, self.author):
+                Post.objects.create(author=author, text=f'Пост {i}')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_celebrity_posts_are_not_fanned_out(self):
+        """Посты знаменитости не копируются в ленты подписчиков."""
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.celebrity).exists())
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(),
+            POSTS_PER_PAGE)
+
+    def test_follow_index_merges_pulled_posts(self):
+        """Лента подписок сливает материализованную ленту
+        с постами знаменитостей."""
+        url = reverse('posts:follow_index')
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.reader_client.get(url, {'cursor': cursor})
+            page_obj = response.context['page_obj']
+            self.assertLessEqual(len(page_obj), POSTS_PER_PAGE)
+            seen.extend(page_obj)
+            cursor = page_obj.next_cursor
+        self.assertEqual(
+            seen, list(Post.objects.order_by('-pub_date', '-id')))
+
+    def test_demoted_celebrity_posts_are_backfilled(self):
+        """Когда автор опускается ниже порога, его посты попадают
+        в ленты оставшихся подписчиков."""
+        Follow.objects.filter(user=self.fan).delete()
+        self.assertEqual(
+            FeedEntry.objects.filter(
+                user=self.reader, post__author=self.celebrity).count(),
+            POSTS_PER_PAGE)
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.order_by('-pub_date', '-id')[:POSTS_PER_PAGE]))
+
+    def test_pulled_posts_single_query(self):
+        """Посты знаменитостей читаются одним запросом, сколько бы
+        знаменитостей ни было в подписках."""
+        url = reverse('posts:follow_index')
+        self.reader_client.get(url)
+        # Сессия, пользователь, подписки на знаменитостей, лента, их посты
+        with self.assertNumQueries(5):
+            self.reader_client.get(url)
+        other = User.objects.create_user(username='other-celebrity')
+        for user in (self.reader, self.fan):
+            Follow.objects.create(user=user, author=other)
+        Post.objects.create(author=other, text='Пост другой знаменитости')
+        self.reader_client.get(url)
+        with self.assertNumQueries(5):
+            response = self.reader_client.get(url)
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.order_by('-pub_date', '-id')[:POSTS_PER_PAGE]))
+
+    def test_follow_index_previous_page(self):
+        """Курсор назад в смешанной ленте возвращает первую страницу."""
+        url = reverse('posts:follow_index')
+        first = self.reader_client.get(url).context['page_obj']
+        second = self.reader_client.get(
+            url, {'cursor': first.next_cursor}).context['page_obj']
+        previous = self.reader_client.get(
+            url, {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(previous), list(first))
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {number}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_first_page_inline(self):
+        """На странице поста выводится только первая страница
+        комментариев, старые первыми, и ссылка на следующую."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.id,)))
+        comments = response.context['comments']
+        self.assertEqual(
+            self.texts(comments), ['Комментарий 0', 'Комментарий 1'])
+        self.assertContains(response, comments.next_cursor)
+
+    def test_fragment_pages(self):
+        """Следующие страницы отдаются HTML-фрагментом и JSON."""
+        url = reverse('posts:post_comments', args=(self.post.id,))
+        first = self.client.get(url)
+        second = self.client.get(
+            url, {'cursor': first.context['comments'].next_cursor})
+        self.assertEqual(
+            self.texts(second.context['comments']),
+            ['Комментарий 2', 'Комментарий 3'],
+        )
+        self.assertTemplateUsed(second, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(second, 'base.html')
+        data = self.client.get(url, {
+            'cursor': second.context['comments'].next_cursor,
+            'format': 'json',
+        }).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            ['Комментарий 4'],
+        )
+        self.assertIsNone(data['next_cursor'])
+
+    def test_add_comment_expires_only_last_page(self):
+        """Новый комментарий сбрасывает кэш только последней страницы."""
+        url = reverse('posts:post_comments', args=(self.post.id,))
+        cursors = [None]
+        while True:
+            comments = self.client.get(
+                url, {'cursor': cursors[-1] or ''}).context['comments']
+            if not comments.has_next():
+                break
+            cursors.append(comments.next_cursor)
+        self.client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': 'Новый'},
+        )
+        for cursor in cursors[:-1]:
+            with self.assertNumQueries(0):
+                comments_page(self.post.id, cursor)
+        last = comments_page(self.post.id, cursors[-1])
+        self.assertEqual(self.texts(last), ['Комментарий 4', 'Новый'])
+
+    def test_delete_expires_all_pages(self):
+        """Удаление комментария сбрасывает все страницы."""
+        comments_page(self.post.id)
+        Comment.objects.filter(text='Комментарий 0').delete()
+        self.assertEqual(
+            self.texts(comments_page(self.post.id)),
+            ['Комментарий 1', 'Комментарий 2'],
+        )
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=(self.group.slug,)),
+            'profile': reverse('posts:profile', args=(self.author.username,)),
+            'detail': reverse('posts:post_detail', args=(self.post.id,)),
+        }
+
+    def revalidate(self, url, client=None):
+        client = client or self.client
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизменившиеся страницы отдаются как 304 без их построения."""
+        budgets = {'index': 0, 'group': 1, 'profile': 1, 'detail': 1}
+        for name, url in self.urls.items():
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(budgets[name]):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_update_etag(self):
+        """Новый пост, комментарий и подписка меняют ETag страниц."""
+        changes = (
+            (lambda: Post.objects.create(
+                author=self.author, text='Новый', group=self.group),
+             ('index', 'group', 'profile', 'detail')),
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+             ('index', 'group', 'profile', 'detail')),
+            (lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+             ('profile',)),
+        )
+        for change, names in changes:
+            etags = {
+                name: self.client.get(url)['ETag']
+                for name, url in self.urls.items()
+            }
+            change()
+            for name in names:
+                with self.subTest(change=names, url=name):
+                    response = self.client.get(
+                        self.urls[name], HTTP_IF_NONE_MATCH=etags[name])
+                    self.assertEqual(response.status_code, 200)
+
+    def test_comment_count_in_cached_lists(self):
+        """Новый и удалённый комментарий меняют число комментариев
+        в закэшированных карточках списков."""
+        lists = ('index', 'group', 'profile')
+        for name in lists:
+            self.assertContains(
+                self.client.get(self.urls[name]), 'комментариев: 0')
+        self.client.force_login(self.reader)
+        self.client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': 'Комментарий'},
+        )
+        for name in lists:
+            with self.subTest(url=name):
+                self.assertContains(
+                    self.client.get(self.urls[name]), 'комментариев: 1')
+        Comment.objects.get(post=self.post).delete()
+        for name in lists:
+            with self.subTest(url=name):
+                self.assertContains(
+                    self.client.get(self.urls[name]), 'комментариев: 0')
+
+    def test_renamed_author_in_cached_lists(self):
+        """Новое имя автора видно в закэшированных списках,
+        в том числе на страницах его групп."""
+        for url in self.urls.values():
+            self.client.get(url)
+        self.author.first_name = 'Переименованный'
+        self.author.save()
+        for name in ('index', 'group', 'profile'):
+            with self.subTest(url=name):
+                self.assertContains(
+                    self.client.get(self.urls[name]), 'Переименованный')
+
+    def test_etag_depends_on_session(self):
+        """Страница гостя не отдаётся пользователю как неизменившаяся."""
+        etag = self.client.get(self.urls['index'])['ETag']
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        response = reader_client.get(
+            self.urls['index'], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.revalidate(self.urls['index'], reader_client).status_code,
+            304,
+        )
+
+
+class PostListFragmentTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for number in range(POSTS_PER_PAGE * 2 + 3):
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fragments_continue_pages(self):
+        """Фрагменты по курсору из полной страницы продолжают список
+        без повторов и без base.html."""
+        pages = (
+            ('posts:index', 'posts:index_fragment', ()),
+            ('posts:group_list', 'posts:group_list_fragment', ('group',)),
+            ('posts:profile', 'posts:profile_fragment', ('author',)),
+        )
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        for page_name, fragment_name, args in pages:
+            with self.subTest(page=page_name):
+                response = self.client.get(reverse(page_name, args=args))
+                seen = list(response.context['page_obj'])
+                fragment_url = reverse(fragment_name, args=args)
+                self.assertContains(response, f'{fragment_url}?cursor=')
+                self.assertContains(response, 'js/infinite.js')
+                html = response.content.decode()
+                while 'data-infinite-more' in html:
+                    cursor = html.split(f'{fragment_url}?cursor=')[1]
+                    cursor = cursor.split('"')[0]
+                    response = self.client.get(
+                        fragment_url, {'cursor': cursor})
+                    html = response.content.decode()
+                    self.assertNotIn('<html', html)
+                    self.assertTemplateUsed(
+                        response, 'posts/includes/post_card.html')
+                    seen.extend(response.context['page_obj'])
+                self.assertEqual(seen, expected)
@@ -0,0 +1,147 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.templatetags.static import static
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import tokey
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+
+from core import profiling
+from . import versions
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Все размеры миниатюр постов, которые выводят шаблоны
+POST_THUMBNAILS = (
+    ('960x600', {'crop': 'center', 'upscale': True}),
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+PENDING_KEY = 'posts:thumbnail:pending:{}'
+PENDING_TIMEOUT = 60 * 5
+
+_executor = None
+
+
+class PlaceholderImageFile(DummyImageFile):
+    """Заглушка того же размера, пока миниатюра не готова."""
+
+    @property
+    def url(self):
+        return static(settings.THUMBNAIL_PLACEHOLDER)
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Не создаёт миниатюры во время запроса.
+
+    Готовая миниатюра берётся из key-value хранилища sorl-thumbnail,
+    иначе её создание ставится в очередь, а шаблон получает заглушку."""
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with profiling.timer('thumb'):
+            return self._get_thumbnail(file_, geometry_string, **options)
+
+    def _get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        thumbnail = ImageFile(
+            self._get_thumbnail_filename(
+                source, geometry_string, self._normalize(source, options)),
+            default.storage,
+        )
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        enqueue(source.name, geometry_string, options)
+        return PlaceholderImageFile(geometry_string)
+
+    def generate(self, file_, geometry_string, **options):
+        """Создаёт миниатюру так же, как обычный бэкенд sorl-thumbnail."""
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _normalize(self, source, options):
+        """Те же опции, что достраивает ThumbnailBackend.get_thumbnail:
+        от них зависит имя файла миниатюры."""
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def _generate(name, geometry_string, options, pending_key):
+    start = time.perf_counter()
+    try:
+        default.backend.generate(name, geometry_string, **options)
+        expire_post_lists(name)
+        profiling.observe(
+            'thumbnails:generate', 'thumb',
+            (time.perf_counter() - start) * 1000,
+        )
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s %s',
+                         name, geometry_string)
+    finally:
+        cache.delete(pending_key)
+        if settings.THUMBNAIL_WORKERS:
+            connection.close()
+
+
+def expire_post_lists(name):
+    """Закэшированные списки с постами картинки name показывают
+    заглушку: после создания миниатюры они устаревают."""
+    scopes = {versions.INDEX}
+    posts = Post.objects.filter(image=name).order_by().values_list(
+        'author_id', 'group_id').distinct()
+    for author_id, group_id in posts:
+        scopes.add(versions.author_scope(author_id))
+        if group_id:
+            scopes.add(versions.group_scope(group_id))
+    versions.bump(*scopes)
+
+
+def enqueue(name, geometry_string, options):
+    """Ставит создание миниатюры в очередь фоновых потоков.
+    Одна и та же миниатюра не ставится дважды, в том числе
+    из разных процессов с общим кэшем с атомарным add
+    (см. CACHES в settings)."""
+    pending_key = PENDING_KEY.format(
+        tokey(name, geometry_string, sorted(options.items())))
+    if not cache.add(pending_key, True, PENDING_TIMEOUT):
+        return
+    job = (name, geometry_string, dict(options), pending_key)
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: _get_executor().submit(_generate, *job))
+    else:
+        transaction.on_commit(lambda: _generate(*job))
+
+
+def enqueue_post(post):
+    """Ставит в очередь все миниатюры картинки поста."""
+    if not post.image:
+        return
+    for geometry_string, options in POST_THUMBNAILS:
+        enqueue(post.image.name, geometry_string, options)
@@ -0,0 +1,305 @@
+"""Выгрузка и загрузка постов, комментариев, групп и подписок в NDJSON.
+
+Каждая строка — один объект:
+{"model": "post", "pk": 1, "fields": {"text": ..., "author": "leo", ...}}.
+Пользователи передаются по username, остальные связи — по pk.
+Выгрузка читает базу курсором порциями, загрузка пишет пачками
+bulk_create, поэтому память не растёт с объёмом данных."""
+import json
+from collections import Counter as Stats
+from datetime import datetime
+from itertools import groupby, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed, groups, search, versions
+from .models import Comment, Follow, Group, Post
+from .seeding import explicit_pub_date
+
+User = get_user_model()
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+
+# Имя в файле: (модель, {поле в файле: поле выборки}).
+# Порядок важен при загрузке: связанные объекты идут раньше.
+MODELS = {
+    'group': (Group, {
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    }),
+    'post': (Post, {
+        'text': 'text',
+        'author': 'author__username',
+        'group': 'group_id',
+        'image': 'image',
+        'pub_date': 'pub_date',
+    }),
+    'comment': (Comment, {
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'pub_date': 'pub_date',
+    }),
+    'follow': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+USER_FIELDS = {'author', 'user'}
+
+
+class TransferError(Exception):
+    pass
+
+
+class Encoder(DjangoJSONEncoder):
+    """Даты с микросекундами: DjangoJSONEncoder обрезает их
+    до миллисекунд, а по pub_date посты упорядочиваются."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def model_names(value=None):
+    """Имена моделей из строки через запятую, по умолчанию все."""
+    if not value:
+        return list(MODELS)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in MODELS]
+    if unknown:
+        raise TransferError(f'Неизвестные модели: {", ".join(unknown)}')
+    return [name for name in MODELS if name in names]
+
+
+def export(names=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки NDJSON для моделей names по возрастанию pk."""
+    for name in names or MODELS:
+        model, fields = MODELS[name]
+        rows = model.objects.order_by('pk').values_list(
+            'pk', *fields.values()).iterator(chunk_size=chunk_size)
+        for pk, *values in rows:
+            record = {
+                'model': name,
+                'pk': pk,
+                'fields': dict(zip(fields, values)),
+            }
+            yield json.dumps(
+                record, cls=Encoder, ensure_ascii=False) + '\n'
+
+
+def load(lines, batch_size=IMPORT_BATCH_SIZE):
+    """Загружает строки NDJSON. Объекты с уже занятым pk или нарушающие
+    уникальность пропускаются. Возвращает {(модель, исход): число}."""
+    stats = Stats()
+    scopes = set()
+    records = (json.loads(line) for line in lines if line.strip())
+    try:
+        with explicit_pub_date(Post, Comment):
+            for name, group in groupby(records, key=lambda row: row['model']):
+                if name not in MODELS:
+                    raise TransferError(f'Неизвестная модель: {name}')
+                while True:
+                    batch = list(islice(group, batch_size))
+                    if not batch:
+                        break
+                    with transaction.atomic():
+                        created = _load_batch(name, batch, scopes)
+                    stats[name, 'created'] += created
+                    stats[name, 'skipped'] += len(batch) - created
+    finally:
+        # Уже записанные пачки остаются и при ошибке в файле
+        loaded = {
+            name for (name, outcome), number in stats.items()
+            if outcome == 'created' and number
+        }
+        if loaded:
+            _reset_sequences()
+            refresh(loaded, scopes)
+    return stats
+
+
+def refresh(names, scopes):
+    """Пересчитывает счётчики, зависящие от загруженных моделей names:
+    bulk_create не вызывает сигналов. Закэшированные страницы
+    устаревают по версиям scopes."""
+    counters.reconcile(models=[MODELS[name][0] for name in names])
+    versions.bump(*scopes)
+
+
+def _load_batch(name, batch, scopes):
+    """Записывает пачку, обновляет для созданных объектов ленты
+    и индекс и добавляет в scopes версии кэша, которые она меняет.
+    Возвращает число созданных объектов."""
+    model, _ = MODELS[name]
+    users = _resolve_users({
+        record['fields'][field]
+        for record in batch for field in USER_FIELDS & set(record['fields'])
+    })
+    existing = set(model.objects.filter(
+        pk__in=[record['pk'] for record in batch]).values_list(
+        'pk', flat=True))
+    batch = [record for record in batch if record['pk'] not in existing]
+    objects = list(BUILDERS[name](batch, users))
+    model.objects.bulk_create(objects, ignore_conflicts=True)
+    # Пропущенные из-за конфликтов объекты лишь сбросят лишнюю версию
+    scopes.update(SCOPES[name](objects))
+    created = list(model.objects.filter(
+        pk__in=[obj.pk for obj in objects]).values_list('pk', flat=True))
+    if created and name in LOADED:
+        LOADED[name](created)
+    return len(created)
+
+
+def _resolve_users(usernames):
+    """{username: id}; недостающие пользователи создаются
+    без пароля, войти они смогут после сброса пароля."""
+    ids = dict(User.objects.filter(
+        username__in=usernames).values_list('username', 'id'))
+    missing = usernames - set(ids)
+    if missing:
+        User.objects.bulk_create(
+            [User(username=username, password=make_password(None))
+             for username in missing],
+            ignore_conflicts=True,
+        )
+        ids.update(User.objects.filter(
+            username__in=missing).values_list('username', 'id'))
+    return ids
+
+
+def _existing(model, ids):
+    return set(model.objects.filter(
+        pk__in={pk for pk in ids if pk is not None}).values_list(
+        'pk', flat=True))
+
+
+def _build_group(batch, users):
+    for record in batch:
+        yield Group(pk=record['pk'], **record['fields'])
+
+
+def _build_post(batch, users):
+    groups = _existing(Group, [record['fields']['group'] for record in batch])
+    for record in batch:
+        fields = record['fields']
+        yield Post(
+            pk=record['pk'],
+            text=fields['text'],
+            author_id=users[fields['author']],
+            group_id=fields['group'] if fields['group'] in groups else None,
+            image=fields['image'],
+            pub_date=parse_datetime(fields['pub_date']),
+        )
+
+
+def _build_comment(batch, users):
+    posts = _existing(Post, [record['fields']['post'] for record in batch])
+    for record in batch:
+        fields = record['fields']
+        if fields['post'] not in posts:
+            continue
+        yield Comment(
+            pk=record['pk'],
+            post_id=fields['post'],
+            author_id=users[fields['author']],
+            text=fields['text'],
+            pub_date=parse_datetime(fields['pub_date']),
+        )
+
+
+def _build_follow(batch, users):
+    for record in batch:
+        user, author = (
+            users[record['fields']['user']],
+            users[record['fields']['author']],
+        )
+        if user != author:
+            yield Follow(pk=record['pk'], user_id=user, author_id=author)
+
+
+BUILDERS = {
+    'group': _build_group,
+    'post': _build_post,
+    'comment': _build_comment,
+    'follow': _build_follow,
+}
+
+
+def _listing_scopes(author_id, group_id):
+    scopes = {versions.INDEX, versions.author_scope(author_id)}
+    if group_id:
+        scopes.add(versions.group_scope(group_id))
+    return scopes
+
+
+def _group_scopes(objects):
+    return {versions.INDEX, groups.GROUPS} | {
+        versions.group_scope(group.pk) for group in objects}
+
+
+def _post_scopes(posts):
+    return set().union(*(
+        _listing_scopes(post.author_id, post.group_id) for post in posts))
+
+
+def _comment_scopes(comments):
+    """Страницы комментариев и списки, где выводится их число."""
+    post_ids = {comment.post_id for comment in comments}
+    posts = Post.objects.filter(pk__in=post_ids).values_list(
+        'author_id', 'group_id').distinct()
+    return {versions.comments_scope(post_id) for post_id in post_ids}.union(
+        *(_listing_scopes(*post) for post in posts))
+
+
+def _follow_scopes(follows):
+    return {
+        versions.follows_scope(user_id)
+        for follow in follows
+        for user_id in (follow.user_id, follow.author_id)
+    }
+
+
+SCOPES = {
+    'group': _group_scopes,
+    'post': _post_scopes,
+    'comment': _comment_scopes,
+    'follow': _follow_scopes,
+}
+
+
+def _posts_loaded(post_ids):
+    """Как сигналы сохранения постов: ленты подписчиков и индекс."""
+    feed.fan_out_posts(post_ids)
+    search.get_backend().index_ids(post_ids)
+
+
+def _follows_loaded(follow_ids):
+    """Как сигналы подписки: знаменитости и ленты новых подписчиков."""
+    feed.reset_celebrities()
+    feed.backfill_follows(follow_ids)
+
+
+# Что делают сигналы для созданных объектов, по id одной пачки
+LOADED = {
+    'post': _posts_loaded,
+    'follow': _follows_loaded,
+}
+
+
+def _reset_sequences():
+    """После вставки с явными pk последовательности (PostgreSQL)
+    должны продолжиться после максимального pk, как в loaddata."""
+    models = [model for model, _ in MODELS.values()] + [User]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
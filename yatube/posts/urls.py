@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -8,13 +8,37 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('fragments/posts/', views.index_fragment, name='index_fragment'),
+    path(
+        'fragments/group/<slug>/',
+        views.group_posts_fragment, name='group_list_fragment'),
+    path(
+        'fragments/profile/<str:username>/',
+        views.profile_fragment, name='profile_fragment'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('search/', views.search, name='search'),
+    path('search/api/', views.search_api, name='search_api'),
+    path('export/', views.export_ndjson, name='export'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments, name='post_comments'),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment, name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('api/v1/posts/', api.index, name='api_index'),
+    path(
+        'api/v1/posts/<int:post_id>/',
+        api.post_detail, name='api_post_detail'),
+    path(
+        'api/v1/groups/<slug>/posts/',
+        api.group_posts, name='api_group_posts'),
+    path(
+        'api/v1/profiles/<str:username>/',
+        api.profile, name='api_profile'),
+    path('api/v1/follow/', api.follow_index, name='api_follow_index'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -0,0 +1,81 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import quote_etag
+
+VERSION_KEY = 'posts:version:{}'
+INDEX = 'index'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follows_scope(user_id):
+    """Подписчики и подписки пользователя."""
+    return f'follows:{user_id}'
+
+
+def comments_scope(post_id):
+    """Все страницы комментариев поста."""
+    return f'comments:{post_id}'
+
+
+def comments_tail_scope(post_id):
+    """Последняя страница комментариев поста: новые комментарии
+    попадают только на неё."""
+    return f'comments:{post_id}:tail'
+
+
+def _new_version():
+    # Версия по времени не совпадёт с теми, что были до вытеснения ключа.
+    return time.time_ns()
+
+
+def version(scope):
+    """Текущая версия закэшированных списков постов scope."""
+    key = VERSION_KEY.format(scope)
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _new_version(), None)
+        value = cache.get(key)
+    return value
+
+
+def bump(*scopes):
+    """Делает устаревшими фрагменты списков постов scopes."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def listing_context(scope):
+    """Переменные для {% cache %} вокруг списка постов."""
+    return {
+        'posts_version': version(scope),
+        'posts_cache_timeout': settings.POST_LIST_CACHE_TIMEOUT,
+    }
+
+
+def etag(request, *scopes):
+    """Валидатор страницы для условного GET. Считается по кэшу, без
+    запросов к базе: версии scopes, адрес с параметрами и cookie сессии
+    и CSRF, от которых зависят шапка и формы. Меняется не реже раза
+    в POST_LIST_CACHE_TIMEOUT — столько живут и фрагменты списков."""
+    window = int(time.time() // settings.POST_LIST_CACHE_TIMEOUT)
+    parts = [version(scope) for scope in scopes] + [
+        window,
+        request.get_full_path(),
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+    ]
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
@@ -1,77 +1,263 @@
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.http import (
+    HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.functional import SimpleLazyObject
 
-from core.pagination import paginate
+from core.pagination import (
+    CURSOR_PARAM, paginate, paginate_cursor, paginate_merged,
+    paginate_pages
+)
+from core.uploadhandlers import too_large_uploads
+from . import images, thumbnails, versions
+from .comments import comments_page
+from .counters import comment_counts, post_count, profile_counts
+from .feed import FEED_ORDERING, as_posts, feed_for, feed_sources
 from .forms import PostForm, CommentForm
 from .models import Group, Post, Follow
+from .search import search_posts
+from .transfer import TransferError, export, model_names
 
 User = get_user_model()
 POSTS_PER_PAGE = settings.POSTS_PER_PAGE
 
 
+def lazy_comment_counts(page_obj):
+    """Число комментариев к постам страницы. Считается только при
+    выводе, поэтому закэшированный список запросов не добавляет."""
+    return SimpleLazyObject(
+        lambda: comment_counts([post.id for post in page_obj]))
+
+
+def with_etag(response, etag):
+    response['ETag'] = etag
+    return response
+
+
+def reject_too_large_uploads(request, form):
+    """Ошибка формы для файлов, загрузка которых прервана
+    на FILE_UPLOAD_MAX_SIZE (core.uploadhandlers)."""
+    if form.is_bound:
+        for field in too_large_uploads(request):
+            form.add_error(field, images.too_large_error())
+
+
+def post_list_context(page_obj, scope, page_url, fragment_url):
+    """Переменные списка карточек постов: версия его кэша, число
+    комментариев и адреса следующей страницы — целой и фрагментом."""
+    return {
+        'page_obj': page_obj,
+        'comment_counts': lazy_comment_counts(page_obj),
+        'page_url': page_url,
+        'fragment_url': fragment_url,
+        **versions.listing_context(scope),
+    }
+
+
+def post_list_fragment(request, post_list, scope, page_url):
+    """Только карточки постов страницы по курсору, без base.html:
+    для подгрузки при прокрутке (static/js/infinite.js)."""
+    etag = versions.etag(request, scope)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    page_obj = paginate_cursor(request, post_list, POSTS_PER_PAGE)
+    context = post_list_context(page_obj, scope, page_url, request.path)
+    return with_etag(
+        render(request, 'posts/fragments/post_list.html', context), etag)
+
+
 def index(request):
-    post_list = Post.objects.all()
+    etag = versions.etag(request, versions.INDEX)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    post_list = Post.objects.for_listing()
     page_obj = paginate(
         request,
         post_list,
-        POSTS_PER_PAGE
+        POSTS_PER_PAGE,
+        count=post_count(),
     )
-    context = {
-        'page_obj': page_obj,
-    }
-    return render(request, 'posts/index.html', context)
+    context = post_list_context(
+        page_obj, versions.INDEX, request.path,
+        reverse('posts:index_fragment'))
+    return with_etag(render(request, 'posts/index.html', context), etag)
+
+
+def index_fragment(request):
+    return post_list_fragment(
+        request, Post.objects.for_listing(), versions.INDEX,
+        reverse('posts:index'))
 
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    etag = versions.etag(request, versions.group_scope(group.id))
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    post_list = group.posts.for_listing()
     page_obj = paginate(
         request,
         post_list,
-        POSTS_PER_PAGE
+        POSTS_PER_PAGE,
+        count=post_count(group_id=group.id),
     )
     context = {
         'group': group,
-        'page_obj': page_obj,
+        **post_list_context(
+            page_obj, versions.group_scope(group.id), request.path,
+            reverse('posts:group_list_fragment', args=(slug,))),
     }
-    return render(request, 'posts/group_list.html', context)
+    return with_etag(
+        render(request, 'posts/group_list.html', context), etag)
+
+
+def group_posts_fragment(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return post_list_fragment(
+        request, group.posts.for_listing(), versions.group_scope(group.id),
+        reverse('posts:group_list', args=(slug,)))
 
 
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    posts_count = posts.count()
+    etag = versions.etag(
+        request,
+        versions.author_scope(author.id),
+        versions.follows_scope(author.id),
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    posts = author.posts.for_listing()
+    counts = profile_counts(author.id)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=author).exists()
     page_obj = paginate(
         request,
         posts,
-        POSTS_PER_PAGE
+        POSTS_PER_PAGE,
+        count=counts['posts_count'],
     )
     context = {
-        'page_obj': page_obj,
         'author': author,
-        'posts_count': posts_count,
         'following': following,
+        **counts,
+        **post_list_context(
+            page_obj, versions.author_scope(author.id), request.path,
+            reverse('posts:profile_fragment', args=(username,))),
     }
-    return render(request, 'posts/profile.html', context)
+    return with_etag(render(request, 'posts/profile.html', context), etag)
+
+
+def profile_fragment(request, username):
+    author = get_object_or_404(User, username=username)
+    return post_list_fragment(
+        request, author.posts.for_listing(),
+        versions.author_scope(author.id),
+        reverse('posts:profile', args=(username,)))
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    count_post = post.author.posts.count()
+    post = get_object_or_404(Post.objects.for_listing(), pk=post_id)
+    scopes = [
+        versions.author_scope(post.author_id),
+        versions.comments_scope(post.id),
+        versions.comments_tail_scope(post.id),
+    ]
+    if post.group_id:
+        scopes.append(versions.group_scope(post.group_id))
+    etag = versions.etag(request, *scopes)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    count_post = post_count(author_id=post.author_id)
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comments_page(post.id, request.GET.get(CURSOR_PARAM))
     context = {
         'post': post,
         'count_post': count_post,
         'form': form,
         'comments': comments,
     }
+    return with_etag(
+        render(request, 'posts/post_detail.html', context), etag)
+
+
+def post_comments(request, post_id):
+    """Следующие страницы комментариев: HTML-фрагмент
+    или JSON при format=json."""
+    comments = comments_page(post_id, request.GET.get(CURSOR_PARAM))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'pub_date': comment.pub_date.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search(request):
+    """Полнотекстовый поиск по постам."""
+    query = request.GET.get('q', '').strip()
+    # Порядок по релевантности: курсор по дате его бы потерял
+    page_obj = paginate_pages(
+        request,
+        search_posts(query, Post.objects.for_listing()),
+        POSTS_PER_PAGE,
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
 
-    return render(request, 'posts/post_detail.html', context)
+
+def search_api(request):
+    """Результаты поиска по постам в JSON."""
+    query = request.GET.get('q', '').strip()
+    page_obj = paginate_pages(
+        request,
+        search_posts(query, Post.objects.for_listing()),
+        POSTS_PER_PAGE,
+    )
+    results = [
+        {
+            'id': post.id,
+            'text': post.text,
+            'author': post.author.username,
+            'group': post.group.slug if post.group else None,
+            'pub_date': post.pub_date.isoformat(),
+            'url': reverse('posts:post_detail', args=(post.id,)),
+        }
+        for post in page_obj
+    ]
+    return JsonResponse({
+        'query': query,
+        'count': page_obj.paginator.count,
+        'page': page_obj.number,
+        'has_next': page_obj.has_next(),
+        'results': results,
+    })
 
 
 @login_required
@@ -80,10 +266,12 @@ def post_create(request):
         request.POST or None,
         files=request.FILES or None,
     )
+    reject_too_large_uploads(request, form)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.enqueue_post(post)
         return redirect('posts:profile', request.user.username)
     return render(request, 'posts/post_create.html', {'form': form})
 
@@ -99,8 +287,11 @@ def post_edit(request, post_id):
         files=request.FILES or None,
         instance=post
     )
+    reject_too_large_uploads(request, form)
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue_post(post)
         return redirect('posts:post_detail', post_id)
 
     context = {
@@ -110,6 +301,20 @@ def post_edit(request, post_id):
     return render(request, 'posts/post_create.html', context)
 
 
+@staff_member_required
+def export_ndjson(request):
+    """Выгрузка в NDJSON потоком: строки формируются по мере
+    чтения базы, ответ целиком в памяти не держится."""
+    try:
+        names = model_names(request.GET.get('models'))
+    except TransferError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        export(names), content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="yatube.ndjson"'
+    return response
+
+
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
@@ -126,15 +331,20 @@ def add_comment(request, post_id):
 def follow_index(request):
     """Страница, куда будут выведены посты авторов,
     на которых подписан текущий пользователь."""
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate(
-        request,
-        posts,
-        POSTS_PER_PAGE
-    )
+    sources = feed_sources(request.user)
+    if len(sources) > 1:
+        page_obj = paginate_merged(request, sources, POSTS_PER_PAGE)
+    else:
+        page_obj = paginate(
+            request,
+            feed_for(request.user),
+            POSTS_PER_PAGE,
+            ordering=FEED_ORDERING,
+        )
+    page_obj.object_list = as_posts(page_obj)
     context = {
         'page_obj': page_obj,
-        'no_follows': not posts.exists()
+        'no_follows': not page_obj.object_list,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -0,0 +1,45 @@
+// Подгружает следующие страницы списка постов при прокрутке.
+// Без скрипта ссылка «Показать ещё» открывает следующую страницу целиком.
+(function () {
+  if (!('IntersectionObserver' in window)) {
+    return;
+  }
+  document.querySelectorAll('[data-infinite-nav]').forEach(function (nav) {
+    nav.hidden = true;
+  });
+
+  function load(sentinel) {
+    observer.unobserve(sentinel);
+    fetch(sentinel.dataset.fragmentUrl, {credentials: 'same-origin'})
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error(response.status);
+        }
+        return response.text();
+      })
+      .then(function (html) {
+        sentinel.insertAdjacentHTML('afterend', html);
+        sentinel.remove();
+        watch();
+      })
+      .catch(function () {
+        window.location = sentinel.querySelector('a').href;
+      });
+  }
+
+  var observer = new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+      if (entry.isIntersecting) {
+        load(entry.target);
+      }
+    });
+  }, {rootMargin: '600px'});
+
+  function watch() {
+    document.querySelectorAll('[data-infinite-more]').forEach(function (sentinel) {
+      observer.observe(sentinel);
+    });
+  }
+
+  watch();
+})();
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -58,12 +60,25 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# cached.Loader компилирует шаблоны, в том числе включаемые, один раз
+# на процесс (замеры: manage.py render_benchmark). Задан явно: сам Django
+# включает его только без DEBUG. TEMPLATE_CACHE=0 — перечитывать шаблоны
+# при каждой отрисовке, чтобы правки видны были без перезапуска.
+TEMPLATE_CACHE = os.getenv('TEMPLATE_CACHE', default='1') == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATE_CACHE:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.ProfiledDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -80,13 +95,59 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Прагмы выполняются при каждом новом соединении (core.db_backends.sqlite3).
+# WAL: читатели не блокируют писателя и наоборот; synchronous=normal
+# в WAL не теряет целостность, лишь последние транзакции при сбое питания;
+# busy_timeout — сколько мс ждать занятую базу до database is locked;
+# cache_size < 0 — размер кэша страниц в КиБ; mmap_size — в байтах.
+SQLITE_OPTIONS = {
+    'pragmas': {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', default='wal'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', default='normal'),
+        'busy_timeout': int(
+            os.getenv('SQLITE_BUSY_TIMEOUT', default=5000)),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', default=-64000)),
+        'mmap_size': int(
+            os.getenv('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024)),
+        'temp_store': 'memory',
+    },
+    # Транзакции сразу берут блокировку записи и ждут её busy_timeout
+    'transaction_mode': 'IMMEDIATE',
+}
+# Сколько секунд держать соединение между запросами; 0 — закрывать
+# после каждого запроса, None — не закрывать
+CONN_MAX_AGE = int(os.getenv('CONN_MAX_AGE', default=600))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db_backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'OPTIONS': SQLITE_OPTIONS,
     }
 }
 
+# Реплики только для чтения: DATABASE_REPLICAS=/path/replica1.sqlite3,...
+# Для локальной проверки подойдёт копия db.sqlite3. В тестах реплики
+# зеркалируют основную базу.
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+    filter(None, os.getenv('DATABASE_REPLICAS', default='').split(',')),
+    start=1,
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'core.db_backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'OPTIONS': SQLITE_OPTIONS,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы
+DATABASE_REPLICA_PIN = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -136,14 +197,68 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+# Сколько последних постов автора попадает в ленту нового подписчика
+FEED_BACKFILL_SIZE = 500
+# С какого числа подписчиков посты автора не рассылаются по лентам,
+# а подмешиваются в ленту при чтении
+FEED_CELEBRITY_FOLLOWERS = 10000
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся на диск частями; файлы больше FILE_UPLOAD_MAX_SIZE
+# отклоняются, картинки постов больше POST_IMAGE_MAX_PIXELS пикселей
+# отклоняются до декодирования, остальные уменьшаются до
+# POST_IMAGE_MAX_SIZE по большей стороне и перекодируются
+FILE_UPLOAD_HANDLERS = [
+    'core.uploadhandlers.LimitedTemporaryFileUploadHandler',
+]
+FILE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_SIZE = 1920
+POST_IMAGE_FORMAT = 'WEBP'
+POST_IMAGE_QUALITY = 80
+
+# Миниатюры создаются фоновыми потоками, а не во время запроса;
+# 0 потоков - создавать сразу после коммита
+THUMBNAIL_BACKEND = 'posts.thumbnails.PregeneratedThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_PLACEHOLDER = 'img/thumbnail-placeholder.svg'
+
+# Доля запросов, для которых собирается профиль (0..1), и пространства
+# имён URL, чьи представления отдают Server-Timing и пишут гистограммы
+PROFILING_SAMPLE_RATE = float(
+    os.getenv('PROFILING_SAMPLE_RATE', default=1.0 if DEBUG else 0.05))
+PROFILING_NAMESPACES = ('posts',)
+
+# Полнотекстовый поиск по постам: SQLiteFTSBackend для SQLite,
+# posts.search.LikeBackend для баз без FTS5
+POST_SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+
+# slug группы, выбранной в форме нового поста по умолчанию
+POST_DEFAULT_GROUP = os.getenv('POST_DEFAULT_GROUP', default='')
+
+# Наибольший размер страницы JSON API (параметр limit)
+API_MAX_PAGE_SIZE = 100
+
+# Сколько секунд хранится отрисованный список постов страницы
+POST_LIST_CACHE_TIMEOUT = 60 * 15
+
+# Для нескольких процессов gunicorn нужен общий кэш с атомарным add
+# (на нём держатся блокировки пересчёта и очередь миниатюр): memcached
+# или CACHE_BACKEND=core.cache_backends.FileBasedCache
+# и CACHE_LOCATION=/var/tmp/yatube_cache. Встроенный в Django
+# filebased.FileBasedCache не подходит: add у него не атомарен.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }